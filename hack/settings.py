@@ -38,7 +38,6 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'report',
-    'dj_pagination',
 ]
 
 MIDDLEWARE_CLASSES = [
@@ -50,7 +49,6 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'dj_pagination.middleware.PaginationMiddleware',
 ]
  
 
@@ -86,14 +84,61 @@ WSGI_APPLICATION = 'hack.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/1.9/ref/settings/#databases
+# sqlite by default, opened in WAL mode by report/apps.py so pages are
+# served while a crawl writes.  DB_ENGINE=postgresql (needs psycopg2)
+# for several crawl workers or a busy site.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'hack'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),   # seconds a connection is reused
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'OPTIONS': {'timeout': 30},   # seconds to wait for a writer's lock
+            # a file: the crawler tests write from pipeline threads, which
+            # would each get their own empty in-memory database
+            'TEST': {'NAME': os.path.join(BASE_DIR, 'test.sqlite3')},
+        }
+    }
+
 
-DATABASES = {
+# Cache
+# shared by the web server and manage.py crawlworker, so it has to live
+# outside the process.  'pages' holds the rendered index and report pages
+# (two entries per report): a full cache culls a random third of itself,
+# so it is sized well above that.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'pages'),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
 }
 
+INDEX_PAGE_SIZE = 25         # reports per index page
+
+INDEX_CACHE_TIMEOUT = 3600   # seconds a rendered index page is kept
+
+REPORT_CACHE_TIMEOUT = 7 * 24 * 3600   # rendered report pages; the crawler re-versions changed ones
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
@@ -132,3 +177,81 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.9/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Crawler
+
+HACKERONE_URL = os.environ.get('HACKERONE_URL', 'https://hackerone.com')
+
+CRAWL_WORKERS = 4      # report detail fetches in flight
+
+CRAWL_RATE = 0.5       # requests per second, halved on 429/503 ...
+
+CRAWL_MAX_RATE = 4     # ... and raised again while hackerone answers
+
+CRAWL_POOL_SIZE = 10   # hosts kept in the keep-alive pool
+
+CRAWL_POOL_PER_HOST = CRAWL_WORKERS + 1   # open connections per host
+
+CRAWL_BATCH_SIZE = 25  # reports written per transaction
+
+CRAWL_QUEUE_SIZE = 50  # items buffered between pipeline stages
+
+CRAWL_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive')   # raw responses, None to disable
+
+CRAWL_HTTP_CACHE = os.path.join(BASE_DIR, 'httpcache.sqlite3')   # None to disable
+
+CRAWL_HTTP_CACHE_TTL = 30 * 24 * 3600   # seconds an entry may be revalidated
+
+CRAWL_HTTP_CACHE_BYTES = 256 << 20      # LRU eviction above this many body bytes
+
+CRAWL_STREAM_JSON = False  # parse report details while they download: less memory, slower (ijson's C backend if installed)
+
+CRAWL_SHARDS = 1       # processes for scrappe / manage.py crawl, see report/shards.py
+
+CRAWL_FETCH_ATTEMPTS = 4   # tries per report detail before it goes to the dead-letter table
+
+CRAWL_BACKOFF_BASE = 1.0   # seconds; the pause before retry n is random up to base * 2**n ...
+
+CRAWL_BACKOFF_MAX = 60.0   # ... and never more than this
+
+JOB_HEARTBEAT = 30     # seconds between a crawlworker's "still running" updates of its job
+
+JOB_STALE_AFTER = 300  # a running job without a heartbeat for this long is requeued
+
+
+# Exports
+
+EXPORT_DIR = os.path.join(BASE_DIR, 'export')   # manage.py export writes Parquet/Arrow parts here
+
+
+# Assets
+
+ASSET_DIR = os.path.join(BASE_DIR, 'assets')   # mirrored attachments and images, None to disable
+
+ASSET_WORKERS = 4      # concurrent downloads
+
+ASSET_RATE = 2         # downloads per second
+
+ASSET_MAX_BYTES = 50 << 20   # larger files are not mirrored
+
+ASSET_SENDFILE_HEADER = None   # 'X-Sendfile' or 'X-Accel-Redirect' when the front server sends the files
+
+ASSET_SENDFILE_PREFIX = None   # X-Accel-Redirect: the internal nginx location aliased to ASSET_DIR
+
+# Logging
+# one JSON line per written batch on the 'report.crawl' logger, for log shippers
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'bare': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'bare'},
+    },
+    'loggers': {
+        'report': {'handlers': ['console'], 'level': os.environ.get('REPORT_LOG_LEVEL', 'INFO')},
+    },
+}
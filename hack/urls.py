@@ -15,12 +15,21 @@ Including another URLconf
 """
 from django.conf.urls import url
 from django.contrib import admin
-from report import views
+from report import api, assets, views
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^scrapper/',views.scrapper),
     url(r'^$',views.index),
     url(r'^reports/(?P<id>\d+)/',views.report),
-    url(r'^update/',views.updates)
+    url(r'^update/',views.updates),
+    url(r'^refresh/',views.refreshes),
+    url(r'^jobs/(?P<id>\d+)/',views.job_status),
+    url(r'^cache/stats/',views.cache_stats),
+    url(r'^stats/$',views.stats),
+    url(r'^metrics$',views.metrics),
+    url(r'^api/reports/$',api.reports),
+    url(r'^api/reports/(?P<id>\d+)/$',api.report),
+    url(r'^api/export/$',api.export),
+    url(r'^assets/(?P<digest>[0-9a-f]{64})/(?P<name>[^/]*)$',assets.serve),
     
 ]
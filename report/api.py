@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from report.models import result, dialogue, summar
+
+API_PAGE_SIZE = getattr(settings, 'API_PAGE_SIZE', 25)
+API_MAX_PAGE_SIZE = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 500)   # <= 999, ids go into one IN (...)
+
+REPORT_FIELDS = [f.attname for f in result._meta.fields if f.name != 'id']
+SUMMARY_FIELDS = [f.attname for f in summar._meta.fields if f.name not in ('id', 'report')]
+ACTIVITY_FIELDS = [f.attname for f in dialogue._meta.fields if f.name not in ('id', 'report')]
+CHILDREN = ('summaries', 'activities')
+
+FILTERS = {
+    'team': 'team_name',
+    'severity': 'severity_rating',
+    'state': 'state',
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def api_view(func):
+    def view(request, *args, **kwargs):
+        try:
+            return func(request, *args, **kwargs)
+        except BadRequest as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    view.__name__ = func.__name__
+    view.__doc__ = func.__doc__
+    return view
+
+
+def projection(request, children):
+    """Report columns and child lists named by ``fields=``; without it,
+    every column plus ``children``."""
+    names = [name for name in request.GET.get('fields', '').split(',') if name]
+    if not names:
+        return REPORT_FIELDS, list(children)
+    unknown = [name for name in names if name not in REPORT_FIELDS and name not in CHILDREN]
+    if unknown:
+        raise BadRequest('unknown field(s): %s' % ', '.join(unknown))
+    columns = [name for name in names if name in REPORT_FIELDS]
+    if 'report_id' not in columns:
+        columns.insert(0, 'report_id')   # children are joined on it
+    return columns, [name for name in names if name in CHILDREN]
+
+
+def filtered(request):
+    reports = result.objects.all()
+    for param, column in FILTERS.items():
+        if request.GET.get(param):
+            reports = reports.filter(**{column: request.GET[param]})
+    for param, lookup in (('disclosed_after', 'disclosed_at__gte'), ('disclosed_before', 'disclosed_at__lt')):
+        if request.GET.get(param):
+            reports = reports.filter(**{lookup: moment(param, request.GET[param])})
+    return reports
+
+
+def moment(param, value):
+    # a date or a full ISO 8601 timestamp
+    try:
+        at = parse_datetime(value) or parse_date(value)
+    except ValueError:
+        at = None
+    if at is None:
+        raise BadRequest('%s: expected YYYY-MM-DD or an ISO 8601 timestamp' % param)
+    if not isinstance(at, datetime.datetime):
+        at = datetime.datetime.combine(at, datetime.time())
+    if timezone.is_naive(at):
+        at = timezone.make_aware(at)
+    return at
+
+
+def integer(request, param, default):
+    try:
+        return int(request.GET.get(param, default))
+    except ValueError:
+        raise BadRequest('%s: expected an integer' % param)
+
+
+def attach(rows, children):
+    # one query per child table for the whole chunk of reports
+    if not rows or not children:
+        return rows
+    ids = [row['report_id'] for row in rows]
+    for name, model, fields in (('summaries', summar, SUMMARY_FIELDS), ('activities', dialogue, ACTIVITY_FIELDS)):
+        if name not in children:
+            continue
+        grouped = dict((report_id, []) for report_id in ids)
+        for child in model.objects.filter(report_id__in=ids).order_by('report_id', 'pk').values('report_id', *fields):
+            grouped[child.pop('report_id')].append(child)
+        for row in rows:
+            row[name] = grouped[row['report_id']]
+    return rows
+
+
+@api_view
+def reports(request):
+    """Reports newest first, filtered, paged by ``after=<report_id>``."""
+    columns, children = projection(request, ())
+    limit = min(max(integer(request, 'limit', API_PAGE_SIZE), 1), API_MAX_PAGE_SIZE)
+    queryset = filtered(request).order_by('-report_id')
+    after = request.GET.get('after')
+    if after:
+        queryset = queryset.filter(report_id__lt=integer(request, 'after', None))
+    rows = list(queryset.values(*columns)[:limit + 1])
+    more = len(rows) > limit
+    rows = attach(rows[:limit], children)
+    return JsonResponse({
+        'reports': rows,
+        'next': rows[-1]['report_id'] if more else None,
+    })
+
+
+@api_view
+def report(request, id):
+    """One report with its summaries and activities."""
+    columns, children = projection(request, CHILDREN)
+    rows = list(result.objects.filter(report_id=id).values(*columns))
+    if not rows:
+        return JsonResponse({'error': 'no report %s' % id}, status=404)
+    return JsonResponse(attach(rows, children)[0])
+
+
+def chunks(queryset, size=EXPORT_CHUNK_SIZE):
+    # keyset chunks: memory stays flat even where the backend cannot
+    # stream a cursor (sqlite fetches a whole result set at once)
+    last = None
+    while True:
+        chunk = queryset.order_by('report_id')
+        if last is not None:
+            chunk = chunk.filter(report_id__gt=last)
+        rows = list(chunk[:size].iterator())
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]['report_id']
+
+
+@api_view
+def export(request):
+    """Every matching report as NDJSON, one object per line, streamed."""
+    columns, children = projection(request, CHILDREN)
+    queryset = filtered(request).values(*columns)
+
+    def lines():
+        for rows in chunks(queryset):
+            for row in attach(rows, children):
+                yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="reports.ndjson"'
+    return response
@@ -1,7 +1,30 @@
 from __future__ import unicode_literals
 
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+# WAL lets the web server read while a crawl writes; with it, NORMAL only
+# risks the last transactions on power loss, never corruption
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 256 << 20),
+    ('busy_timeout', 30000),   # ms a writer waits for the lock instead of "database is locked"
+)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', SQLITE_PRAGMAS)
+    with connection.cursor() as cursor:
+        for name, value in pragmas:
+            cursor.execute('PRAGMA %s = %s' % (name, value))
 
 
 class ReportConfig(AppConfig):
     name = 'report'
+
+    def ready(self):
+        connection_created.connect(configure_sqlite, dispatch_uid='report.configure_sqlite')
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import codecs
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class Archive(object):
+    """Append-only store of every raw hackerone response.
+
+    Records are JSON lines (kind, key, url, sha1, fetched_at, body) written
+    as gzip members into ``segment-NNNNNN.jsonl.gz`` files of roughly
+    ``segment_bytes`` each; concatenated members read back as one gzip
+    stream.  ``index.tsv`` lists ``kind key sha1 segment`` for every
+    record, so a response whose content did not change since it was last
+    archived is not stored again: the fetch is recorded without a body
+    and ``latest`` takes the body from the record it refers to.  Writers in separate processes each
+    pass their own ``name`` and append to ``segment-<name>-NNNNNN`` and
+    ``index-<name>.tsv`` only; every reader sees all of them.
+    """
+
+    def __init__(self, root, segment_bytes=64 << 20, buffer_bytes=1 << 20, name=''):
+        self.root = root
+        self.prefix = 'segment-%s-' % name if name else 'segment-'
+        self.index_name = 'index-%s.tsv' % name if name else 'index.tsv'
+        self.segment_bytes = segment_bytes
+        self.buffer_bytes = buffer_bytes
+        self.lock = threading.Lock()
+        self.seen = None
+        self.buffer = []
+        self.buffered = 0
+        self.index = []
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, self.index_name)
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.root, 'segment-*.jsonl.gz')))
+
+    def own_segments(self):
+        return sorted(glob.glob(os.path.join(self.root, self.prefix + '[0-9]' * 6 + '.jsonl.gz')))
+
+    def _load(self):
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        self.seen = set()
+        for path in glob.glob(os.path.join(self.root, 'index*.tsv')):
+            with open(path) as f:
+                for line in f:
+                    kind, key, digest, segment = line.rstrip('\n').split('\t')
+                    self.seen.add((kind, key, digest))
+        segments = self.own_segments()
+        self.segment = segments[-1] if segments else self._segment_path(1)
+
+    def _segment_path(self, number):
+        return os.path.join(self.root, '%s%06d.jsonl.gz' % (self.prefix, number))
+
+    def add(self, kind, key, url, body):
+        digest = hashlib.sha1(body).hexdigest()
+        with self.lock:
+            if self.seen is None:
+                self._load()
+            if (kind, str(key), digest) in self.seen:
+                self._reference(kind, key, url, digest)
+                return False
+            self.seen.add((kind, str(key), digest))
+            self.buffer.append(json.dumps({
+                'kind': kind,
+                'key': key,
+                'url': url,
+                'sha1': digest,
+                'fetched_at': time.time(),
+                'body': body.decode('utf-8'),
+            }) + '\n')
+            self.buffered += len(body)
+            self.index.append('%s\t%s\t%s\t%s\n' % (kind, key, digest, os.path.basename(self.segment)))
+            if self.buffered >= self.buffer_bytes:
+                self._flush()
+        return True
+
+    def add_stream(self, kind, key, url, fileobj, digest):
+        """Archive a body that was spooled to ``fileobj`` (sha1 ``digest``)
+        without reading it back into memory in one piece."""
+        with self.lock:
+            if self.seen is None:
+                self._load()
+            if (kind, str(key), digest) in self.seen:
+                self._reference(kind, key, url, digest)
+                return False
+            self.seen.add((kind, str(key), digest))
+            self._flush()   # records stay in index order
+            head = json.dumps({
+                'kind': kind,
+                'key': key,
+                'url': url,
+                'sha1': digest,
+                'fetched_at': time.time(),
+            })
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            fileobj.seek(0)
+            with open(self.segment, 'ab') as f:
+                member = gzip.GzipFile(fileobj=f, mode='wb')
+                member.write(head[:-1] + ', "body": "')
+                for chunk in iter(lambda: fileobj.read(64 << 10), ''):
+                    member.write(json.dumps(decoder.decode(chunk))[1:-1])
+                member.write(json.dumps(decoder.decode('', final=True))[1:-1] + '"}\n')
+                member.close()
+            self.index.append('%s\t%s\t%s\t%s\n' % (kind, key, digest, os.path.basename(self.segment)))
+            self._flush()
+        return True
+
+    def _reference(self, kind, key, url, digest):
+        # the body is archived already; the fetch still counts, or a
+        # report that went A -> B -> A would be re-ingested as B
+        line = json.dumps({
+            'kind': kind,
+            'key': key,
+            'url': url,
+            'sha1': digest,
+            'fetched_at': time.time(),
+        }) + '\n'
+        self.buffer.append(line)
+        self.buffered += len(line)
+        self.index.append('%s\t%s\t%s\t%s\n' % (kind, key, digest, os.path.basename(self.segment)))
+        if self.buffered >= self.buffer_bytes:
+            self._flush()
+
+    def _flush(self):
+        if not self.index:
+            return
+        if self.buffer:
+            with open(self.segment, 'ab') as f:
+                member = gzip.GzipFile(fileobj=f, mode='wb')
+                member.write(''.join(self.buffer))
+                member.close()
+        # the index only names records whose data is already on disk
+        with open(self.index_path, 'a') as f:
+            f.write(''.join(self.index))
+        self.buffer = []
+        self.index = []
+        self.buffered = 0
+        if os.path.getsize(self.segment) >= self.segment_bytes:
+            number = int(os.path.basename(self.segment)[len(self.prefix):-len('.jsonl.gz')])
+            self.segment = self._segment_path(number + 1)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def records(self, kind=None):
+        # in file order, which is not fetch order: segment-shardN-* sort
+        # after the segments of every later unsharded crawl
+        for path in self.segments():
+            with gzip.open(path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if kind is None or record['kind'] == kind:
+                        yield record
+
+    def latest(self, kind):
+        """The most recently fetched record of every ``kind`` key, by
+        ``fetched_at``, with the body of the record it refers to when
+        that fetch was a duplicate.  Two passes over the segments, only
+        the (fetched_at, sha1) of each key is kept in between."""
+        newest = {}
+        for record in self.records(kind):
+            key = str(record['key'])
+            if key not in newest or record['fetched_at'] >= newest[key][0]:
+                newest[key] = (record['fetched_at'], record['sha1'])
+        for record in self.records(kind):
+            key = str(record['key'])
+            if 'body' in record and key in newest and newest[key][1] == record['sha1']:
+                fetched_at = newest.pop(key)[0]
+                yield dict(record, fetched_at=fetched_at)
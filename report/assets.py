@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+import binascii
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import socket
+import urllib
+import urlparse
+from HTMLParser import HTMLParser
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.html import escape
+
+from report.blobs import BlobStore, TooLarge
+from report.cache import report_cache
+from report.client import ACCEPT_ENCODING, CrawlerClient
+from report.models import asset
+from report.pipeline import Pipeline, Stage
+from report.ratelimit import TokenBucket
+from report.retry import FetchError, PermanentError, retrying
+
+ASSET_DIR = getattr(settings, 'ASSET_DIR', None)
+ASSET_WORKERS = getattr(settings, 'ASSET_WORKERS', 4)
+ASSET_RATE = getattr(settings, 'ASSET_RATE', 2)
+ASSET_MAX_BYTES = getattr(settings, 'ASSET_MAX_BYTES', 50 << 20)
+# links (not just images) to these hosts are mirrored too
+ASSET_LINK_HOSTS = getattr(settings, 'ASSET_LINK_HOSTS', ())
+# 'X-Sendfile' (Apache, lighttpd) or 'X-Accel-Redirect' (nginx): the
+# front server sends the file; without it Django streams it
+ASSET_SENDFILE_HEADER = getattr(settings, 'ASSET_SENDFILE_HEADER', None)
+ASSET_SENDFILE_PREFIX = getattr(settings, 'ASSET_SENDFILE_PREFIX', None)   # nginx internal location
+
+IMG_SRC = re.compile(r'''<img\b[^>]*?\bsrc\s*=\s*(["'])(.*?)\1''', re.I | re.S)
+A_HREF = re.compile(r'''<a\b[^>]*?\bhref\s*=\s*(["'])(.*?)\1''', re.I | re.S)
+URL_ATTRIBUTE = re.compile(r'''(\b(?:src|href)\s*=\s*)(["'])(.*?)\2''', re.I | re.S)
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# served inline; anything else (html, svg, pdf ...) is a download, never
+# a page of this site
+INLINE_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp')
+unescape = HTMLParser().unescape
+MAX_REDIRECTS = 5
+# urls come from reporter-written HTML and what they point at is
+# published under /assets/: nothing on these networks is ever fetched
+NOT_PUBLIC = (
+    '0.0.0.0/8', '10.0.0.0/8', '100.64.0.0/10', '127.0.0.0/8', '169.254.0.0/16', '172.16.0.0/12',
+    '192.0.0.0/24', '192.168.0.0/16', '198.18.0.0/15', '224.0.0.0/4', '240.0.0.0/4',
+    '::/128', '::1/128', '64:ff9b::/96', 'fc00::/7', 'fe80::/10', 'ff00::/8',
+)
+
+
+def references(row, summaries, activities):
+    """What a parsed report points at: attachments and embedded images,
+    as (key, url, file name, content type)."""
+    found = {}
+    attachments = list(getattr(row, 'attachments', []))
+    for activity in activities:
+        attachments.extend(getattr(activity, 'attachments', []))
+    for attachment in attachments:
+        url = attachment.get('expiring_url') or attachment.get('url')
+        if attachment.get('id') is not None and url:
+            found['attachment:%s' % attachment['id']] = (url, attachment.get('file_name') or '',
+                                                         attachment.get('content_type') or '')
+    html = [row.vulnerability_information_html] + [s.content_html for s in summaries] + \
+           [a.markdown_message for a in activities]
+    for text in html:
+        for url in embedded(text or ''):
+            found['url:%s' % hashlib.sha1(url.encode('utf-8')).hexdigest()] = (url, file_name(url), '')
+    return [(key,) + value for key, value in found.items()]
+
+
+def embedded(html):
+    for match in IMG_SRC.finditer(html):
+        url = unescape(match.group(2)).strip()
+        if url.startswith(('http://', 'https://')):
+            yield url
+    for match in A_HREF.finditer(html):
+        url = unescape(match.group(2)).strip()
+        if urlparse.urlsplit(url).hostname in ASSET_LINK_HOSTS:
+            yield url
+
+
+def file_name(url):
+    return posixpath.basename(urlparse.urlsplit(url).path)[:255]
+
+
+def collect(batch):
+    """ReportWriter listener: queue what the batch's reports point at.
+
+    A reference seen again refreshes the stored url (attachment links
+    expire), and sends a failed download back to pending.
+    """
+    for row, summaries, activities, page in batch:
+        refs = references(row, summaries, activities)
+        if not refs:
+            continue
+        stored = dict((a.key, a) for a in asset.objects.filter(report_id=row.report_id,
+                                                                 key__in=[ref[0] for ref in refs]))
+        for key, url, name, content_type in refs:
+            current = stored.get(key)
+            if current is None:
+                asset.objects.create(report_id=row.report_id, key=key, url=url,
+                                     file_name=name, content_type=content_type)
+            elif current.status != 'done' and (current.url != url or current.status == 'failed'):
+                asset.objects.filter(pk=current.pk).update(url=url, status='pending', error='')
+
+
+class Mirror(object):
+    """Downloads pending assets into the blob store.
+
+    ``ASSET_WORKERS`` threads share one token bucket of ``ASSET_RATE``
+    requests per second and one connection pool; a url referenced by
+    several reports is fetched once.  Results are written by the calling
+    thread, and each report whose assets changed gets a new page version.
+    Only public addresses are fetched, checked before the request, on
+    every redirect and on the connected socket.
+    """
+
+    def __init__(self, root=ASSET_DIR, workers=ASSET_WORKERS, rate=ASSET_RATE, max_bytes=ASSET_MAX_BYTES):
+        self.store = BlobStore(root)
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.limiter = TokenBucket(rate=rate, burst=workers, max_rate=rate)
+        self.client = CrawlerClient(per_host=workers, timeout=60,
+                                    headers={'Accept': '*/*', 'Accept-Encoding': ACCEPT_ENCODING})
+        self.done = 0
+        self.failed = 0
+
+    def run(self, retry_failed=False):
+        statuses = ['pending', 'failed'] if retry_failed else ['pending']
+        groups = {}
+        for pk, url in asset.objects.filter(status__in=statuses).order_by('pk').values_list('pk', 'url'):
+            groups.setdefault(url, []).append(pk)
+        stages = [Stage('download', self.download, self.workers, self.workers * 4),
+                  Stage('record', self.record, 1, self.workers * 4)]
+        try:
+            Pipeline(stages).run(groups.items())
+        finally:
+            self.client.close()
+        return self.done, self.failed
+
+    def download(self, item):
+        url, pks = item
+        try:
+            yield pks, retrying(lambda: self.fetch(url)), None
+        except FetchError as e:
+            yield pks, None, e
+
+    def fetch(self, url):
+        # redirects are followed here, so that every hop is checked
+        for hop in range(MAX_REDIRECTS + 1):
+            check_url(url)
+            self.limiter.acquire()
+            r = self.client.get(url, stream=True, allow_redirects=False)
+            if not r.is_redirect:
+                return self.save(r)
+            r.close()
+            url = urlparse.urljoin(url, r.headers['Location'])
+        raise PermanentError('more than %d redirects' % MAX_REDIRECTS)
+
+    def save(self, r):
+        try:
+            # DNS may have answered differently since check_url
+            address = peer_address(r)
+            if address is not None and not public_address(address):
+                raise PermanentError('connected to %s, not a public address' % address)
+            if r.status_code in (429, 503):
+                self.limiter.throttle()
+            r.raise_for_status()
+            self.limiter.recover()
+            if int(r.headers.get('Content-Length') or 0) > self.max_bytes:
+                raise PermanentError('larger than %d bytes' % self.max_bytes)
+            r.raw.enforce_content_length = True
+            try:
+                digest, size = self.store.put(r.iter_content(64 << 10), self.max_bytes)
+            except TooLarge as e:
+                raise PermanentError(str(e))
+            return digest, size, r.headers.get('Content-Type', '').split(';')[0].strip()
+        finally:
+            r.close()
+
+    def record(self, item):
+        pks, fetched, error = item
+        if error is not None:
+            asset.objects.filter(pk__in=pks).update(status='failed', error=error.args[0])
+            self.failed += len(pks)
+            return
+        digest, size, content_type = fetched
+        for current in asset.objects.filter(pk__in=pks):
+            current.sha256 = digest
+            current.size = size
+            # what the attachment metadata says beats a generic server answer
+            current.content_type = (current.content_type or content_type or
+                                    mimetypes.guess_type(current.file_name)[0] or 'application/octet-stream')
+            current.status = 'done'
+            current.error = ''
+            current.fetched_at = timezone.now()
+            current.save()
+        self.done += len(pks)
+        report_cache.bump(set(asset.objects.filter(pk__in=pks).values_list('report_id', flat=True)))
+
+
+def parse_network(network):
+    address, bits = network.split('/')
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    return family, int(binascii.hexlify(socket.inet_pton(family, address)), 16), int(bits)
+
+
+BLOCKED = [parse_network(network) for network in NOT_PUBLIC]
+
+
+def public_address(address):
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    value = int(binascii.hexlify(socket.inet_pton(family, address.split('%')[0])), 16)
+    width = 32 if family == socket.AF_INET else 128
+    if family == socket.AF_INET6 and value >> 32 == 0xffff:
+        family, value, width = socket.AF_INET, value & 0xffffffff, 32   # ::ffff:a.b.c.d
+    for blocked_family, network, bits in BLOCKED:
+        if blocked_family == family and value >> (width - bits) == network >> (width - bits):
+            return False
+    return True
+
+
+def check_url(url):
+    """PermanentError unless ``url`` is http(s) and every address its
+    host resolves to is a public one."""
+    parts = urlparse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise PermanentError('not an http(s) url')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    for family, kind, proto, name, address in socket.getaddrinfo(parts.hostname, port, 0, socket.SOCK_STREAM):
+        if not public_address(address[0]):
+            raise PermanentError('%s resolves to %s, not a public address' % (parts.hostname, address[0]))
+
+
+def peer_address(r):
+    # the address of the socket the streamed response is read from
+    sock = getattr(getattr(r.raw, '_connection', None), 'sock', None)
+    return sock.getpeername()[0] if sock is not None else None
+
+
+def local_url(current):
+    return '/assets/%s/%s' % (current.sha256, urllib.quote((current.file_name or 'file').encode('utf-8')))
+
+
+def localize(html, report_id):
+    """Point the src/href attributes of a rendered report page at the
+    mirrored copies of what they reference."""
+    mirrored = dict((current.url, local_url(current)) for current in
+                    asset.objects.filter(report_id=report_id, status='done'))
+    if not mirrored:
+        return html
+
+    def replace(match):
+        local = mirrored.get(unescape(match.group(3)).strip())
+        if local is None:
+            return match.group(0)
+        return '%s%s%s%s' % (match.group(1), match.group(2), escape(local), match.group(2))
+    return URL_ATTRIBUTE.sub(replace, html)
+
+
+def serve(request, digest, name=None):
+    """A mirrored blob: immutable, with ETag, byte ranges and, when the
+    front server supports it, X-Sendfile / X-Accel-Redirect."""
+    current = asset.objects.filter(sha256=digest, status='done').first()
+    store = BlobStore(ASSET_DIR) if ASSET_DIR else None
+    if current is None or store is None or not store.exists(digest):
+        raise Http404('no such asset')
+    etag = '"%s"' % digest
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponse(status=304)
+    elif ASSET_SENDFILE_HEADER:
+        response = HttpResponse()
+        if ASSET_SENDFILE_PREFIX:
+            response[ASSET_SENDFILE_HEADER] = ASSET_SENDFILE_PREFIX.rstrip('/') + '/' + store.relative(digest)
+        else:
+            response[ASSET_SENDFILE_HEADER] = store.path(digest)
+    else:
+        response = file_response(request, store.path(digest))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Security-Policy'] = "default-src 'none'; sandbox"
+    if response.status_code != 304:
+        content_type = current.content_type or 'application/octet-stream'
+        if content_type in INLINE_TYPES:
+            response['Content-Type'] = content_type
+        else:
+            response['Content-Type'] = 'application/octet-stream'
+            response['Content-Disposition'] = 'attachment; filename="%s"' % (
+                current.file_name or digest).replace('"', '')
+    return response
+
+
+def file_response(request, path):
+    size = os.path.getsize(path)
+    byte_range = parse_range(request.META.get('HTTP_RANGE', ''), size)
+    if byte_range is None:
+        # FileResponse hands the file to wsgi.file_wrapper (sendfile where the server has it)
+        response = FileResponse(open(path, 'rb'))
+        response['Content-Length'] = str(size)
+        return response
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+    start, end = byte_range
+    response = StreamingHttpResponse(read_range(path, start, end - start + 1), status=206)
+    response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+    response['Content-Length'] = str(end - start + 1)
+    return response
+
+
+def parse_range(header, size):
+    """(start, end) of a single ``bytes=`` range, None to send the whole
+    file (no header, several ranges, other units) and False when it
+    cannot be satisfied."""
+    match = RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def read_range(path, start, length, chunk_size=64 << 10):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def mirror(retry_failed=False):
+    """Download everything pending, when ASSET_DIR is set; (done, failed)."""
+    if not ASSET_DIR:
+        return 0, 0
+    return Mirror().run(retry_failed)
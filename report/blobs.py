@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import errno
+import hashlib
+import os
+import tempfile
+
+
+class TooLarge(Exception):
+    pass
+
+
+class BlobStore(object):
+    """Files on disk named by the sha256 of their content.
+
+    ``root/ab/cd/abcd...`` -- the same attachment mirrored for ten
+    reports, or fetched again after its URL expired, is stored once.
+    A blob is written to ``root/tmp`` first and renamed into place, so a
+    path that exists always holds the complete file.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def relative(self, digest):
+        return '/'.join((digest[:2], digest[2:4], digest))
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, chunks, max_bytes=None):
+        """Store the concatenated ``chunks``; returns (sha256, size)."""
+        tmp = os.path.join(self.root, 'tmp')
+        makedirs(tmp)
+        sha256 = hashlib.sha256()
+        size = 0
+        f = tempfile.NamedTemporaryFile(dir=tmp, delete=False)
+        try:
+            with f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise TooLarge('larger than %d bytes' % max_bytes)
+                    sha256.update(chunk)
+                    f.write(chunk)
+            digest = sha256.hexdigest()
+            target = self.path(digest)
+            if os.path.exists(target):
+                os.remove(f.name)   # already there: nothing to do
+            else:
+                makedirs(os.path.dirname(target))
+                os.rename(f.name, target)
+        except BaseException:
+            if os.path.exists(f.name):
+                os.remove(f.name)
+            raise
+        return digest, size
+
+
+def makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:   # another download worker got there first
+            raise
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import os
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.utils import timezone
+
+from report.metrics import REPORT_CACHE
+from report.models import crawlstate
+
+LISTING_GENERATION = 'listing'   # crawlstate row
+PAGE_CACHE = getattr(settings, 'PAGE_CACHE', 'pages')
+REPORT_CACHE_TIMEOUT = getattr(settings, 'REPORT_CACHE_TIMEOUT', 7 * 24 * 3600)
+
+
+def page_cache():
+    # rendered pages have their own cache, sized so they are not culled;
+    # without one they share the default
+    return caches[PAGE_CACHE] if PAGE_CACHE in settings.CACHES else cache
+
+
+def listing_generation():
+    """Part of every index page cache key; bumping it orphans them all.
+
+    The time of the last bump, kept in the database: a cache entry can be
+    culled and start over at a value whose pages are still cached, a
+    timestamp never comes back.
+    """
+    bumped = crawlstate.objects.filter(name=LISTING_GENERATION).values_list('update_time', flat=True).first()
+    if bumped is None:
+        bumped = crawlstate.objects.get_or_create(name=LISTING_GENERATION)[0].update_time
+    return bumped.strftime('%Y%m%d%H%M%S%f')
+
+
+def bump_listing():
+    if not crawlstate.objects.filter(name=LISTING_GENERATION).update(update_time=timezone.now()):
+        crawlstate.objects.get_or_create(name=LISTING_GENERATION)
+
+
+class ReportCache(object):
+    """Rendered report pages, keyed by report id and a content version.
+
+    The crawler gives every report it writes a new version, so a cached
+    page is never invalidated explicitly: it simply stops being looked
+    up.  A hit costs two cache reads and no query.
+    """
+
+    def __init__(self, timeout=REPORT_CACHE_TIMEOUT):
+        self.timeout = timeout
+
+    def version(self, report_id):
+        cache = page_cache()
+        key = 'report:version:%s' % report_id
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex[:12], None)
+            version = cache.get(key)
+        return version
+
+    def get(self, report_id, render):
+        cache = page_cache()
+        key = 'report:page:%s:%s' % (report_id, self.version(report_id))
+        html = cache.get(key)
+        REPORT_CACHE.inc(result='miss' if html is None else 'hit')
+        if html is None:
+            html = render()
+            cache.set(key, html, self.timeout)
+        return html
+
+    def bump(self, report_ids):
+        version = uuid.uuid4().hex[:12]
+        page_cache().set_many(dict(('report:version:%s' % report_id, version) for report_id in report_ids), None)
+
+    def stats(self):
+        hits = REPORT_CACHE.values.get(('hit',), 0)
+        misses = REPORT_CACHE.values.get(('miss',), 0)
+        lookups = hits + misses
+        return {
+            'pid': os.getpid(),   # counters are per web server process
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(float(hits) / lookups, 4) if lookups else None,
+        }
+
+
+report_cache = ReportCache()
+
+
+def invalidate(batch):
+    """ReportWriter listener: once the batch has committed, drop every
+    cached index page and give each report in it a new version.  Waiting
+    for the commit means a page rendered from the old rows in the
+    meantime cannot survive under the new key."""
+    report_ids = [row.report_id for row, summaries, activities, page in batch]
+
+    def bump():
+        bump_listing()
+        report_cache.bump(report_ids)
+    transaction.on_commit(bump)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from django.utils.dateparse import parse_datetime
+
+from report.models import crawlstate
+
+
+class Checkpoint(object):
+    """Where an interrupted crawl should pick up again.
+
+    The listing stage tells the checkpoint how many reports each page
+    sent downstream, the writer tells it which of them were committed.
+    ``last_page`` only moves past pages whose reports are all stored; ids
+    already stored from pages after it are kept in ``ingested`` (as
+    ``id:page`` pairs).
+    """
+
+    def __init__(self, name, pages):
+        self.state, created = crawlstate.objects.get_or_create(name=name)
+        if self.state.finished or created:
+            self.state.last_page = 0
+            self.state.ingested = ''
+            self.state.finished = False
+        self.state.pages = pages
+        self.state.save()
+        # report id -> listing page, for reports stored after last_page
+        self.ingested = dict(item.split(':') for item in self.state.ingested.split(',') if item)
+        self.expected = {}
+        self.stored = {}
+        self.lock = threading.Lock()
+
+    @property
+    def first_page(self):
+        return self.state.last_page + 1
+
+    def expect(self, page, count):
+        with self.lock:
+            self.expected[page] = count
+
+    def unchanged(self, page):
+        # a report the detail stage dropped (304, or dead-lettered) will
+        # never reach commit()
+        with self.lock:
+            self.expected[page] -= 1
+
+    def commit(self, batch):
+        # called by ReportWriter inside the batch transaction
+        with self.lock:
+            for row, summaries, activities, page in batch:
+                self.stored[page] = self.stored.get(page, 0) + 1
+                self.ingested[str(row.report_id)] = str(page)
+            last_page = self.state.last_page
+            while self.stored.get(last_page + 1, 0) >= self.expected.get(last_page + 1, 1):
+                last_page += 1
+                self.stored.pop(last_page, None)
+                self.expected.pop(last_page, None)
+            if last_page > self.state.last_page:
+                self.ingested = dict((report_id, page) for report_id, page in self.ingested.items()
+                                     if int(page) > last_page)
+                self.state.last_page = last_page
+            self.state.ingested = ','.join('%s:%s' % item for item in sorted(self.ingested.items()))
+            self.state.save()
+
+    def finish(self):
+        self.state.last_page = self.state.pages
+        self.state.ingested = ''
+        self.state.finished = True
+        self.state.save()
+
+
+class Watermark(object):
+    """Newest ``latest_disclosable_activity_at`` seen by the last finished crawl.
+
+    The hacktivity feed is sorted by that timestamp, so an incremental
+    sync takes every report above the watermark -- new ones and stored
+    ones with fresh activity -- and stops at the first one below it.
+    """
+
+    def __init__(self, name, incremental=False):
+        self.state, created = crawlstate.objects.get_or_create(name=name)
+        self.since = self.state.watermark if incremental else None
+        self.newest = None
+        self.reached = False
+        self.seen = set()
+
+    def select(self, reports, known):
+        selected = []
+        for report in reports:
+            at = parse_datetime(report.get('latest_disclosable_activity_at') or '')
+            if at is not None and (self.newest is None or at > self.newest):
+                self.newest = at
+            if self.since is None:
+                if report['id'] not in known:
+                    selected.append(report)
+            elif at is not None and at <= self.since:
+                self.reached = True
+                break
+            elif report['id'] not in self.seen:
+                selected.append(report)
+            self.seen.add(report['id'])
+        return selected
+
+    def save(self):
+        if self.newest is not None and (self.state.watermark is None or self.newest > self.state.watermark):
+            self.state.watermark = self.newest
+            self.state.save()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import brotli  # urllib3 only decodes br when it is installed
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+HEADERS = {
+    'Accept': 'application/json, text/javascript, */*; q=0.01',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'content-type': 'application/json',
+    'authority': 'hackerone.com',
+    'x-requested-with': 'XMLHttpRequest',
+}
+
+
+class CrawlerClient(object):
+    """One keep-alive requests.Session shared by get_url and get_content.
+
+    ``pool_size`` is the number of hosts kept in the pool manager and
+    ``per_host`` caps the open connections to each of them; threads
+    block for a free connection instead of opening throwaway ones.
+    """
+
+    def __init__(self, pool_size=10, per_host=4, timeout=100, headers=HEADERS):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.adapter = HTTPAdapter(pool_connections=pool_size,
+                                   pool_maxsize=per_host,
+                                   pool_block=True)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.sent = 0   # by this process; backfill adds its shards' to ``requests``
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with self.lock:
+            self.requests += 1
+            self.sent += 1
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        pools = self.adapter.poolmanager.pools
+        connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+        return {
+            'requests': self.sent,
+            'connections': connections,
+            'reused': max(self.sent - connections, 0),
+        }
+
+    def close(self):
+        self.session.close()
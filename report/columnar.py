@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import os
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from report.models import result, dialogue, summar
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: only manage.py export needs it
+    pyarrow = None
+
+EXPORT_BATCH_SIZE = getattr(settings, 'EXPORT_BATCH_SIZE', 500)   # <= 999, ids go into one IN (...)
+EXPORT_SETTLE = getattr(settings, 'EXPORT_SETTLE', 60)
+TABLES = (('result', result), ('summar', summar), ('dialogue', dialogue))
+SUFFIX = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def arrow_type(field):
+    kind = field.get_internal_type()
+    if kind in ('AutoField', 'IntegerField', 'ForeignKey'):
+        return pyarrow.int64()
+    if kind == 'FloatField':
+        return pyarrow.float64()
+    if kind in ('BooleanField', 'NullBooleanField'):
+        return pyarrow.bool_()
+    if kind == 'DateTimeField':
+        return pyarrow.timestamp('us', tz='UTC')
+    return pyarrow.string()
+
+
+def utc(value):
+    # arrow takes naive datetimes as already being in the column's zone
+    if value is not None and timezone.is_aware(value):
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class TableWriter(object):
+    """Typed columns of one model, written one record batch at a time."""
+
+    def __init__(self, path, model, fmt):
+        self.path = path
+        self.fields = list(model._meta.concrete_fields)
+        self.names = [f.attname for f in self.fields]
+        self.types = [arrow_type(f) for f in self.fields]
+        self.schema = pyarrow.schema([pyarrow.field(name, kind) for name, kind in zip(self.names, self.types)])
+        self.rows = 0
+        if fmt == 'parquet':
+            self.sink = None
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.sink = open(path, 'wb')
+            self.writer = pyarrow.RecordBatchFileWriter(self.sink, self.schema)
+
+    def write(self, rows):
+        if not rows:
+            return
+        arrays = []
+        for n, kind in enumerate(self.types):
+            values = [row[n] for row in rows]
+            if kind == pyarrow.timestamp('us', tz='UTC'):
+                values = [utc(value) for value in values]
+            arrays.append(pyarrow.array(values, type=kind))
+        batch = pyarrow.RecordBatch.from_arrays(arrays, self.names)
+        if self.sink is None:
+            self.writer.write_table(pyarrow.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+        self.rows += len(rows)
+
+    def close(self):
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+
+class Manifest(object):
+    """``manifest.json`` of an export directory: the format and one entry
+    per part.  A part holds every report modified in (since, until] and
+    all of their summaries and activities, so for any report the rows in
+    the latest part that contains it supersede the earlier ones."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, 'manifest.json')
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.data = json.load(f)
+        else:
+            self.data = {'format': None, 'until': None, 'parts': []}
+
+    @property
+    def since(self):
+        return parse_datetime(self.data['until']) if self.data['until'] else None
+
+    def save(self):
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.rename(self.path + '.tmp', self.path)
+
+
+def export(directory, fmt='parquet', full=False, batch_size=EXPORT_BATCH_SIZE):
+    """Append one part with every report changed since the last export.
+
+    Returns the manifest entry of the new part, or None when nothing
+    changed.  ``full`` drops the existing parts and exports everything
+    into a single new one.
+    """
+    if pyarrow is None:
+        raise ImportError('pyarrow is required for columnar exports')
+    if fmt not in SUFFIX:
+        raise ValueError('unknown format %r, expected one of %s' % (fmt, ', '.join(sorted(SUFFIX))))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    manifest = Manifest(directory)
+    if full:
+        for part in manifest.data['parts']:
+            for name in part['files'].values():
+                if os.path.exists(os.path.join(directory, name)):
+                    os.remove(os.path.join(directory, name))
+        manifest.data = {'format': None, 'until': None, 'parts': []}
+        manifest.save()
+    if manifest.data['format'] not in (None, fmt):
+        raise ValueError('%s holds %s parts; export with --full to switch format'
+                         % (directory, manifest.data['format']))
+    since = manifest.since
+    # rows written in the last EXPORT_SETTLE seconds may belong to a batch
+    # that has not committed yet; they go into the next part
+    until = timezone.now() - datetime.timedelta(seconds=EXPORT_SETTLE)
+    changed = result.objects.filter(modified__lte=until)
+    if since is not None:
+        changed = changed.filter(modified__gt=since)
+    number = len(manifest.data['parts']) + 1
+    files = {}
+    writers = {}
+    for name, model in TABLES:
+        files[name] = os.path.join(name, 'part-%06d%s' % (number, SUFFIX[fmt]))
+        if not os.path.isdir(os.path.join(directory, name)):
+            os.makedirs(os.path.join(directory, name))
+        writers[name] = TableWriter(os.path.join(directory, files[name] + '.tmp'), model, fmt)
+    key = writers['result'].names.index('report_id')
+    try:
+        last = None
+        while True:
+            chunk = changed.order_by('report_id')
+            if last is not None:
+                chunk = chunk.filter(report_id__gt=last)
+            rows = list(chunk.values_list(*writers['result'].names)[:batch_size].iterator())
+            if not rows:
+                break
+            writers['result'].write(rows)
+            ids = [row[key] for row in rows]
+            for name, model in TABLES[1:]:
+                writers[name].write(list(model.objects.filter(report_id__in=ids).order_by('report_id', 'pk')
+                                         .values_list(*writers[name].names).iterator()))
+            last = ids[-1]
+    finally:
+        for writer in writers.values():
+            writer.close()
+    counts = dict((name, writer.rows) for name, writer in writers.items())
+    if not counts['result']:
+        for writer in writers.values():
+            os.remove(writer.path)
+        return None
+    for name, writer in writers.items():
+        os.rename(writer.path, os.path.join(directory, files[name]))
+    part = {
+        'part': number,
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat(),
+        'created': timezone.now().isoformat(),
+        'rows': counts,
+        'files': files,
+    }
+    manifest.data['format'] = fmt
+    manifest.data['until'] = until.isoformat()
+    manifest.data['parts'].append(part)
+    manifest.save()
+    return part
@@ -1,231 +1,435 @@
 # -*- coding: utf-8 -*-
-import requests
-import time
 import json
+import logging
+import time
+from django.conf import settings
+from django.db import transaction
 from models import *
-def get_url(page):
-    time.sleep(2) # sometimes hackerone block us
-    url = "https://hackerone.com/hacktivity?sort_type=latest_disclosable_activity_at&filter=type%3Apublic&page="+str(page)
-    headers = {
-                        'Accept':'application/json, text/javascript, */*; q=0.01',
-                        'content-type':'application/json',
-                        'authority':'hackerone.com',
-                        'x-requested-with':'XMLHttpRequest',
-}
-    r = requests.get(url = url,headers=headers,timeout=100)
-    data = json.loads(r.content)    
+from archive import Archive
+from assets import ASSET_DIR, collect, mirror
+from cache import bump_listing, invalidate
+from checkpoint import Checkpoint, Watermark
+from extract import extract_activity, extract_listing, extract_report, extract_summary
+from client import CrawlerClient
+from deadletter import DeadLetters, failed as dead_letters
+from httpcache import HTTPCache
+from metrics import (CONNECTIONS_OPENED, CONNECTIONS_REUSED, HTTP_CACHE_LOOKUPS, HTTP_CACHE_NOT_MODIFIED,
+                     HTTP_RESPONSES, LISTING_PAGES_FAILED, PARSE_SECONDS, RATELIMIT_SECONDS, REGISTRY, REPORTS_FAILED,
+                     REPORTS_FETCHED, REPORTS_SKIPPED, REQUEST_SECONDS, RETRIES, totals)
+from ratelimit import TokenBucket
+from retry import FetchError, classify, retrying
+from pipeline import Pipeline, Stage
+from search import get_backend
+from stats import StatsUpdater
+from store import ReportWriter
+from stream import Tee, iter_report
+
+HACKERONE_URL = getattr(settings, 'HACKERONE_URL', 'https://hackerone.com')
+CRAWL_WORKERS = getattr(settings, 'CRAWL_WORKERS', 4)
+CRAWL_RETRIES = getattr(settings, 'CRAWL_RETRIES', 5)
+CRAWL_BATCH_SIZE = getattr(settings, 'CRAWL_BATCH_SIZE', 25)
+CRAWL_QUEUE_SIZE = getattr(settings, 'CRAWL_QUEUE_SIZE', 50)
+CRAWL_ARCHIVE_DIR = getattr(settings, 'CRAWL_ARCHIVE_DIR', None)
+CRAWL_HTTP_CACHE = getattr(settings, 'CRAWL_HTTP_CACHE', None)
+CRAWL_STREAM_JSON = getattr(settings, 'CRAWL_STREAM_JSON', False)
+CRAWL_SHARDS = getattr(settings, 'CRAWL_SHARDS', 1)
+CRAWL_FETCH_ATTEMPTS = getattr(settings, 'CRAWL_FETCH_ATTEMPTS', 4)
+CRAWL_BACKOFF_BASE = getattr(settings, 'CRAWL_BACKOFF_BASE', 1.0)
+CRAWL_BACKOFF_MAX = getattr(settings, 'CRAWL_BACKOFF_MAX', 60.0)
+NOT_MODIFIED = object()
+logger = logging.getLogger('report.crawl')
+def connect(share=1, name=''):
+    """(Re)create the limiter, archive, HTTP cache and client.
+
+    A shard process calls this right after the fork: it gets its own
+    sockets and file handles, ``share`` of the request rate and archive
+    segments named after it.
+    """
+    global limiter, archive, http_cache, client
+    # sometimes hackerone block us, so every request takes a token from one bucket
+    limiter = TokenBucket(rate=getattr(settings, 'CRAWL_RATE', 0.5) * share,
+                          burst=getattr(settings, 'CRAWL_BURST', 1),
+                          min_rate=getattr(settings, 'CRAWL_MIN_RATE', 0.1) * share,
+                          max_rate=getattr(settings, 'CRAWL_MAX_RATE', 4) * share)
+    # every raw response is kept, so changing parse_report never needs a re-crawl
+    archive = Archive(CRAWL_ARCHIVE_DIR, name=name) if CRAWL_ARCHIVE_DIR else None
+    # ETag / Last-Modified of earlier responses, for conditional requests
+    http_cache = HTTPCache(CRAWL_HTTP_CACHE,
+                           ttl=getattr(settings, 'CRAWL_HTTP_CACHE_TTL', 30 * 24 * 3600),
+                           max_bytes=getattr(settings, 'CRAWL_HTTP_CACHE_BYTES', 256 << 20)) if CRAWL_HTTP_CACHE else None
+    # keep-alive connections shared by the listing loop and the detail workers
+    client = CrawlerClient(pool_size=getattr(settings, 'CRAWL_POOL_SIZE', 10),
+                           per_host=getattr(settings, 'CRAWL_POOL_PER_HOST', CRAWL_WORKERS))
+connect()
+@REGISTRY.collector
+def export_stats():
+    # the client and the HTTP cache count for themselves; /metrics and
+    # the crawl summary read them from the registry
+    stats = client.stats()
+    CONNECTIONS_OPENED.set(stats['connections'])
+    CONNECTIONS_REUSED.set(stats['reused'])
+    if http_cache:
+        stats = http_cache.stats()
+        HTTP_CACHE_LOOKUPS.set(stats['hits'], result='hit')
+        HTTP_CACHE_LOOKUPS.set(stats['misses'], result='miss')
+        HTTP_CACHE_NOT_MODIFIED.set(stats['not_modified'])
+def print_connection_stats():
+    # summed over the backfill shards too, from their attached snapshots
+    flat = totals(REGISTRY.snapshot())
+    print 'connections: %d opened, %d reused' % (flat.get('crawl_connections_opened_total', 0),
+                                                 flat.get('crawl_connections_reused_total', 0))
+    if http_cache:
+        print 'http cache: %d hits, %d misses, %d not modified, %.1f MB' % (
+            flat.get('crawl_http_cache_lookups_total.hit', 0), flat.get('crawl_http_cache_lookups_total.miss', 0),
+            flat.get('crawl_http_cache_not_modified_total', 0), http_cache.stats()['bytes'] / 1048576.0)
+def retry_after(r):
+    try:
+        return float(r.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+def request(url, stream=False, kind=None, conditional=True):
+    headers = http_cache.validators(url) if http_cache and conditional else {}
+    for attempt in range(CRAWL_RETRIES):
+        start = time.time()
+        limiter.acquire()
+        sent = time.time()
+        RATELIMIT_SECONDS.observe(sent - start)
+        r = client.get(url, headers=headers, stream=stream)
+        REQUEST_SECONDS.observe(time.time() - sent, kind=kind or 'other')
+        HTTP_RESPONSES.inc(status=r.status_code)
+        if r.status_code in (429, 503):
+            RETRIES.inc()
+            r.close()
+            limiter.throttle(retry_after(r))
+            continue
+        limiter.recover()
+        break
+    return r
+def fetch(url, kind=None, key=None, unchanged=None, conditional=True):
+    r = request(url, stream=True, kind=kind, conditional=conditional)
+    # streamed, so the connection only goes back to the pool (which
+    # blocks when it is empty) once the response is closed
+    try:
+        r.raw.enforce_content_length = True   # a cut-off body is a network error, not bad JSON
+        if r.status_code == 304:
+            body = http_cache.body(url)
+            if unchanged is not None or body is None:
+                return unchanged
+            return json.loads(body)
+        r.raise_for_status()
+        content = r.content
+    finally:
+        r.close()
+    if http_cache:
+        http_cache.put(url, r.headers.get('ETag'), r.headers.get('Last-Modified'), content)
+    if archive and kind:
+        archive.add(kind, key, url, content)
+    start = time.time()
+    data = json.loads(content)
+    PARSE_SECONDS.observe(time.time() - start, kind=kind or 'other')
     return data
+def get_url(page):
+    url = HACKERONE_URL+"/hacktivity?sort_type=latest_disclosable_activity_at&filter=type%3Apublic&page="+str(page)
+    return fetch(url, 'listing', page)
 def get_content(url):
-    time.sleep(2) # sometimes hackerone block us
-    headers = {
-                        'Accept':'application/json, text/javascript, */*; q=0.01',
-                        'content-type':'application/json',
-                        'authority':'hackerone.com',
-                        'x-requested-with':'XMLHttpRequest',
-}
-    r = requests.get(url = url,headers=headers,timeout=100)
-    result = json.loads(r.content)
-    return result
+    # NOT_MODIFIED when hackerone answers 304: the stored copy is current
+    report_id = url.rstrip('/').rsplit('/', 1)[-1]
+    return fetch(url, 'detail', report_id, NOT_MODIFIED, conditional=is_stored(report_id))
+def get_content_stream(url):
+    # like get_content, but the body is parsed while it is read off the socket
+    r = request(url, stream=True, kind='detail', conditional=is_stored(url.rstrip('/').rsplit('/', 1)[-1]))
+    if r.status_code == 304:
+        r.close()
+        http_cache.body(url)
+        return NOT_MODIFIED
+    try:
+        r.raise_for_status()
+    except Exception:
+        r.close()
+        raise
+    return read_stream(url, r)
+def is_stored(report_id):
+    # the validators are cached when a detail is fetched, not when its
+    # batch commits: a 304 only means "skip" for a report that is stored
+    return http_cache is not None and result.objects.filter(report_id=report_id).exists()
+def read_stream(url, r):
+    r.raw.decode_content = True
+    # a connection dropped mid-body raises (and is retried) instead of
+    # looking like a short, malformed document
+    r.raw.enforce_content_length = True
+    body = Tee(r.raw, spool=archive is not None)
+    try:
+        # only the time spent in the parser (socket reads excluded), like
+        # json.loads on the buffered path; not the caller's extraction
+        events = iter_report(body)
+        parsing = 0.0
+        while True:
+            start = time.time()
+            event = next(events, None)
+            parsing += time.time() - start
+            if event is None:
+                break
+            yield event
+        PARSE_SECONDS.observe(parsing - body.read_time, kind='detail')
+        if http_cache:
+            # only the validators matter: a 304 on a detail is never re-parsed
+            http_cache.put(url, r.headers.get('ETag'), r.headers.get('Last-Modified'), '')
+        if archive:
+            archive.add_stream('detail', url.rstrip('/').rsplit('/', 1)[-1], url, body.spool, body.digest)
+    finally:
+        r.close()
+        if body.spool is not None:
+            body.spool.close()
 def get_page():
     data = get_url(1)
     pages = data['pages']
     total_reports = data['count']
     summary.objects.create(pages=pages,total_reports=total_reports)
+    bump_listing()   # the index page header shows the latest summary
     return pages
-def resu(pages):
-    #sec = 1
-    for i in range(1, pages):
-        #sec = sec +1
-       # if (sec%40==1):
-          #  time.sleep(10)
-        print i
-        data = get_url (i)    
-        reports = data['reports']
-        for report in reports:
-            report_id = report['id']
-            report_title = report['title']
-            
-            url = "https://hackerone.com"+report['url']         
-            try:
-                severity_rating = report['severity_rating']
-            except KeyError:
-                severity_rating = "none" 
-            #try:
-            data = get_content(url)
-            #except requests.exceptions.Timeout:
-            try:
-                state = data['state']
-            except KeyError:
-                state="none"
-            try:
-                substate = data['substate']
-            except KeyError:
-                substate="none"
-            created_at = data['created_at']         
-            try:
-                username = data['reporter']['username']
-                username_url  ="https://hackerone.com"+ data['reporter']['url']
-            except TypeError:
-                username = "null"
-                username_url = ""
-            team_name = data['team']['handle']
-            team_url = data['team']['url']
-            team_about = data['team']['profile']['about']
-            has_bounty = data['has_bounty?']
-            can_view_team = data['can_view_team']
-            is_external_bug = data['is_external_bug']
-            is_participant = data['is_participant']
-            public = data['public']
-            visibility = data['visibility']
-            cve_ids = data['cve_ids']
-            singular_disclosure_disabled = data['singular_disclosure_disabled']
-            disclosed_at = data['disclosed_at']
-            bug_reporter_agreed_on_going_public_at = data['bug_reporter_agreed_on_going_public_at']
-            team_member_agreed_on_going_public_at = data['team_member_agreed_on_going_public_at']
-            comments_closed = data['comments_closed?']
-            vulnerability_information = data['vulnerability_information']
-            vulnerability_information_html = data['vulnerability_information_html']
-            original_report_id = data['original_report_id']
-            original_report_url = data['original_report_url']
-            try:
-                allow_singular_disclosure_at = data['allow_singular_disclosure_at']
-            except KeyError:
-                allow_singular_disclosure_at = "none"
-            try:
-                allow_singular_disclosure_after = data['allow_singular_disclosure_after']
-            except KeyError:
-                allow_singular_disclosure_after = "none"
-            try:
-                singular_disclosure_allowed = data['singular_disclosure_allowed']
-            except KeyError:
-                allow_singular_disclosure_after = "none"
-            vote_count = data['vote_count']
-            if result.objects.get_or_create(report_id=report_id)[1]:
-                for summarie in data['summaries']:
-                    try:
-                        summaries_id = summarie['id']
-                    except KeyError:
-                        summaries_id = "none"
-                    try:
-                        content = summarie['content']
-                    except KeyError:
-                        content = "none"
-                    try:
-                        content_html = summarie['content_html']
-                    except KeyError:
-                        content_html = "none"
-                    try:
-                        category = summarie['category']
-                    except KeyError:
-                        category = "none"
-                    try:
-                        can_view = summarie['can_view?']
-                    except KeyError:
-                        can_view = "none"
-                    try:
-                        can_create = summarie['can_create?']
-                    except KeyError:
-                        can_create = "none"
-                    summar.objects.create(
-                                                 report_id = report_id,
-                                                 summaries_id = summaries_id,
-                                                 content = content,
-                                                 content_html = content_html,
-                                                 )
-                    
-                    
-                for activity in data['activities']:
-                    activity_id = activity['id']
-                    is_internal = activity['is_internal']
-                    editable = activity['editable']
-                    type = activity['type']
-                    message = activity['message']
-                    markdown_message = activity['markdown_message']
-                    automated_response = activity['automated_response']
-                    created_at = activity['created_at']
-                    updated_at = activity['updated_at']
-                    try:
-                        actor_username = activity['actor_username']
-                    except KeyError:
-                        actor_username = "none"
-                    try:
-                        actor_url = activity['actor_url']
-                    except KeyError:
-                        actor_url = "none"
-                    genius_execution_id = activity['genius_execution_id']
-                    team_handle = activity['team_handle']
-                    dialogue.objects.create(
-                                            report_id = report_id,
-                                            activity_id = activity_id,
-                                            is_internal = is_internal,
-                                            editable = editable,
-                                            type = type,
-                                            message = message,
-                                            markdown_message = markdown_message,
-                                            automated_response = automated_response,
-                                            created_at = created_at,
-                                            updated_at = updated_at,
-                                            actor_username = actor_username,
-                                            actor_url = actor_url,
-                                            genius_execution_id = genius_execution_id,
-                                            team_handle = team_handle,
-                                            
-                                            )
-                
-                result.objects.filter(report_id=report_id).update(
-                                                                  title=report_title,
-                                                                  url=url,
-                                                                  severity_rating=severity_rating,
-                                                                 state = state,
-                                                                 substate = substate,
-                                                                 created_at = created_at,
-                                                                 username = username,
-                                                                 username_url = username_url,
-                                                                 team_name = team_name,
-                                                                 team_url = team_url,
-                                                                 team_about = team_about,
-                                                                 has_bounty = has_bounty,
-                                                                 can_view_team = can_view_team,
-                                                                 is_external_bug = is_external_bug,
-                                                                 is_participant = is_participant,
-                                                                 public = public,
-                                                                 visibility = visibility,
-                                                                 cve_ids = cve_ids,
-                                                                 singular_disclosure_disabled = singular_disclosure_disabled,
-                                                                 disclosed_at = disclosed_at,
-                                                                 bug_reporter_agreed_on_going_public_at =bug_reporter_agreed_on_going_public_at,
-                                                                 team_member_agreed_on_going_public_at = team_member_agreed_on_going_public_at,
-                                                                 comments_closed = comments_closed,
-                                                                 vulnerability_information = vulnerability_information,
-                                                                 vulnerability_information_html = vulnerability_information_html,
-                                                                 original_report_id = original_report_id,
-                                                                 original_report_url = original_report_url,
-                                                                 allow_singular_disclosure_at = allow_singular_disclosure_at,
-                                                                 allow_singular_disclosure_after = allow_singular_disclosure_after,
-                                                                 singular_disclosure_allowed = singular_disclosure_allowed,
-                                                                 vote_count = vote_count,
-                                                                  )
-            else:
-                pass
-def  scrappe():
-    pages = get_page()
-    resu(pages)
-def update():
-    pages =get_page()   #last record page
-    summary1= summary.objects.all().last() 
-    total_report1 = summary1.total_reports
-    summary2 = summary.objects.all().order_by('-pk')[1:2]      #last second record
-    for sum2 in summary2:
-        page2 = sum2.pages
-        total_report2 = sum2.total_reports
-        last_time = sum2.create_time
-    page = int(pages)-int(page2)
-    if page==0:
-        page =2
+def resu(pages, checkpoint=None, watermark=None, progress=None, refresh=False):
+    known = set() if refresh else known_reports()
+    first_page = checkpoint.first_page if checkpoint else 1
+    failures = DeadLetters()
+    listeners = batch_listeners() + [failures]
+    if checkpoint:
+        listeners.append(checkpoint.commit)
+    if progress:
+        listeners.append(lambda batch: progress(pages, first_page - 1 + pipeline.stages[0].done,
+                                                writer.written + len(batch)))
+    writer = ReportWriter(CRAWL_BATCH_SIZE, listeners)
+    stages = fetch_stages(known, checkpoint, watermark, failures)
+    stages.append(Stage('write', lambda item: writer.add(*item), 1, CRAWL_QUEUE_SIZE))
+    pipeline = Pipeline(stages, report=print_stats)
+    try:
+        pipeline.run(range(first_page, pages + 1))
+    finally:
+        writer.flush()   # keep whatever was fetched before a failure
+        failures.flush()
+        if archive:
+            archive.flush()
+        REGISTRY.publish(force=True)
+    finish(failures, checkpoint, watermark)
+    if progress:
+        progress(pages, pages, writer.written)
+    print_stats(pipeline.stats())
+    print 'ingested %d reports (write %.1fs, last batch %.3fs)' % (writer.written, writer.write_time, writer.last_write_time)
+    print_connection_stats()
+    mirror_assets()
+def finish(failures, checkpoint=None, watermark=None):
+    if failures.pages:
+        # the checkpoint stops at the first failed page and the watermark
+        # stays put, so the next crawl goes over them again
+        print 'listing pages %s failed, crawl left unfinished' % ', '.join(map(str, sorted(failures.pages)))
+        return
+    if checkpoint:
+        checkpoint.finish()
+    if watermark:
+        watermark.save()
+def batch_listeners(backend=None):
+    # search index, page caches and aggregate stats follow every batch
+    listeners = [(backend or get_backend()).index_batch, invalidate, StatsUpdater()]
+    if ASSET_DIR:
+        listeners.append(collect)   # attachments and images, for mirror_assets()
+    return listeners
+def mirror_assets():
+    done, failed = mirror()
+    if done or failed:
+        print 'mirrored %d assets, %d failed' % (done, failed)
+def fetch_stages(known, checkpoint=None, watermark=None, failures=None):
+    # listing pages in, (row, summaries, activities, page) out
+    stages = [Stage('listing', lambda page: list_page(page, known, checkpoint, watermark, failures))]
+    return stages + detail_stages(checkpoint, failures)
+def detail_stages(checkpoint=None, failures=None):
+    # (page, listing entry) in, (row, summaries, activities, page) out
+    if CRAWL_STREAM_JSON:
+        # detail workers parse while they download, so no parse stage
+        return [Stage('detail', lambda item: stream_detail(item, checkpoint, failures), CRAWL_WORKERS, CRAWL_QUEUE_SIZE)]
+    return [Stage('detail', lambda item: fetch_detail(item, checkpoint, failures), CRAWL_WORKERS, CRAWL_QUEUE_SIZE),
+            Stage('parse', lambda item: parse_detail(item, checkpoint, failures), 1, CRAWL_QUEUE_SIZE)]
+def with_retries(func):
+    return retrying(func, CRAWL_FETCH_ATTEMPTS, CRAWL_BACKOFF_BASE, CRAWL_BACKOFF_MAX)
+def print_stats(stats):
+    print ' | '.join('%(stage)s %(done)d %(rate).1f/s q=%(queue)d' % s for s in stats)
+def known_reports():
+    # one query up front, so stored reports never cost a detail request
+    return set(result.objects.values_list('report_id', flat=True))
+def list_page(page, known, checkpoint=None, watermark=None, failures=None):
+    if watermark and watermark.reached:
+        reports = []   # the rest of the feed is older than the last sync
     else:
-        page = page +2
-    total_report = int(total_report1) - int(total_report2)
-    if total_report==0:
-        pass
+        try:
+            listed = with_retries(lambda: get_url(page)['reports'])
+        except FetchError as e:
+            if failures is None:
+                raise
+            LISTING_PAGES_FAILED.inc()
+            logger.warning('listing page %d given up (%s, %d attempts): %s',
+                           page, e.reason, e.attempts, e.args[0])
+            failures.add_page(page)
+            return []   # no expect(): the checkpoint cannot move past it
+        if watermark:
+            reports = watermark.select(listed, known)
+        else:
+            reports = [report for report in listed if report['id'] not in known]
+        # already stored, or behind the watermark
+        REPORTS_SKIPPED.inc(len(listed) - len(reports), reason='known')
+    # a report pushed onto the next page by new activity is fetched only once
+    known.update(report['id'] for report in reports)
+    if checkpoint:
+        checkpoint.expect(page, len(reports))
+    return [(page, report) for report in reports]
+def fetch_detail(item, checkpoint=None, failures=None):
+    page, report = item
+    try:
+        data = with_retries(lambda: get_content(HACKERONE_URL+report['url']))
+    except FetchError as e:
+        give_up(page, report, e, checkpoint, failures)
+        return
+    if data is NOT_MODIFIED:
+        REPORTS_SKIPPED.inc(reason='unchanged')
+        if checkpoint:
+            checkpoint.unchanged(page)
+        return
+    yield page, report, data
+def parse_detail(item, checkpoint=None, failures=None):
+    page, report, data = item
+    try:
+        row, summaries, activities = parse_report(report, data)
+    except Exception as e:
+        give_up(page, report, classify(e), checkpoint, failures)
+        return
+    REPORTS_FETCHED.inc()
+    yield row, summaries, activities, page
+def stream_detail(item, checkpoint=None, failures=None):
+    page, report = item
+    def download():
+        # a retry starts the request over, whatever was parsed is dropped
+        events = get_content_stream(HACKERONE_URL+report['url'])
+        if events is NOT_MODIFIED:
+            return events
+        return parse_stream(report, events)
+    try:
+        parsed = with_retries(download)
+    except FetchError as e:
+        give_up(page, report, e, checkpoint, failures)
+        return
+    if parsed is NOT_MODIFIED:
+        REPORTS_SKIPPED.inc(reason='unchanged')
+        if checkpoint:
+            checkpoint.unchanged(page)
+        return
+    REPORTS_FETCHED.inc()
+    row, summaries, activities = parsed
+    yield row, summaries, activities, page
+def give_up(page, report, error, checkpoint=None, failures=None):
+    """A detail that failed for good: dead-letter it and let the crawl go on."""
+    if failures is None:
+        raise error
+    REPORTS_FAILED.inc(reason=error.reason)
+    logger.warning('report %s dead-lettered (%s, %d attempts): %s',
+                   report['id'], error.reason, error.attempts, error.args[0])
+    url = HACKERONE_URL+report['url']
+    if http_cache:
+        http_cache.forget(url)   # or the next crawl would get a 304 and skip it
+    failures.add(page, report, error.reason, error.args[0], error.attempts)
+    if checkpoint:
+        checkpoint.unchanged(page)
+def parse_report(report, data):
+    row = parse_result(report, data)
+    summaries = [parse_summary(report['id'], summarie) for summarie in data['summaries']]
+    activities = [parse_activity(report['id'], activity) for activity in data['activities']]
+    return row, summaries, activities
+def parse_stream(report, events):
+    # events from stream.iter_report: every activity and summary becomes a
+    # model instance as soon as it is read, the report fields come last
+    summaries = []
+    activities = []
+    for kind, value in events:
+        if kind == 'activity':
+            activities.append(parse_activity(report['id'], value))
+        elif kind == 'summary':
+            summaries.append(parse_summary(report['id'], value))
+        else:
+            row = parse_result(report, value)
+    return row, summaries, activities
+def parse_result(report, data):
+    fields = extract_report(data)
+    fields.update(extract_listing(report))
+    fields['url'] = HACKERONE_URL+report['url']
+    row = result(**fields)
+    row.attachments = data.get('attachments') or []   # for assets.collect, not stored
+    return row
+def parse_summary(report_id, summarie):
+    return summar(report_id=report_id, **extract_summary(summarie))
+def parse_activity(report_id, activity):
+    row = dialogue(report_id=report_id, **extract_activity(activity))
+    row.attachments = activity.get('attachments') or []
+    return row
+def redrive(reasons=None):
+    """Fetch the dead-lettered reports again, and only those.
+
+    Reports that make it are stored and leave the table; the others stay
+    with their attempts counted up.  Returns (written, still failed).
+    """
+    items = dead_letters(reasons)
+    failures = DeadLetters()
+    writer = ReportWriter(CRAWL_BATCH_SIZE, batch_listeners() + [failures])
+    stages = detail_stages(failures=failures)
+    stages.append(Stage('write', lambda item: writer.add(*item), 1, CRAWL_QUEUE_SIZE))
+    pipeline = Pipeline(stages, report=print_stats)
+    try:
+        pipeline.run(items)
+    finally:
+        writer.flush()
+        failures.flush()
+        if archive:
+            archive.flush()
+        REGISTRY.publish(force=True)
+    print_stats(pipeline.stats())
+    ids = [report['id'] for page, report in items]
+    return writer.written, deadletter.objects.filter(report_id__in=ids).count()
+def reingest(source, clear=False):
+    # rebuild the report tables from an Archive, without touching the network
+    listings = {}
+    # the newest fetch of each page last, so a report that moved between
+    # pages keeps its most recent listing entry
+    for record in sorted(source.latest('listing'), key=lambda record: record['fetched_at']):
+        for report in json.loads(record['body'])['reports']:
+            listings[report['id']] = report
+    backend = get_backend()
+    if clear:
+        with transaction.atomic():
+            dialogue.objects.all().delete()
+            summar.objects.all().delete()
+            result.objects.all().delete()
+            aggregate.objects.all().delete()
+            backend.rebuild()
+    writer = ReportWriter(CRAWL_BATCH_SIZE, batch_listeners(backend))
+    for record in source.latest('detail'):
+        data = json.loads(record['body'])
+        report = listings.get(data['id']) or {
+            'id': data['id'],
+            'title': data['title'],
+            'url': '/reports/%d' % data['id'],
+            'severity_rating': data.get('severity_rating'),
+        }
+        writer.add(*parse_report(report, data))
+    writer.flush()
+    return writer.written
+def  scrappe(progress=None, shards=CRAWL_SHARDS):
+    pages = get_page()
+    # resumes an interrupted crawl, and leaves a watermark for update()
+    if shards > 1:
+        from shards import backfill
+        backfill(pages, shards, Checkpoint('scrappe', pages), Watermark('update'), progress)
     else:
-        resu(page)
+        resu(pages, Checkpoint('scrappe', pages), Watermark('update'), progress)
+def refresh(progress=None):
+    pages = get_page()
+    # revisits every report; unchanged ones cost a 304 and no write
+    resu(pages, progress=progress, refresh=True)
+def update(progress=None):
+    pages = get_page()
+    # walks the feed only down to the previous sync's watermark
+    resu(pages, watermark=Watermark('update', incremental=True), progress=progress)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from report.models import deadletter
+
+
+class DeadLetters(object):
+    """Report details the crawl gave up on, kept for manage.py redrive.
+
+    Detail workers ``add`` failures; they are written by the writer
+    thread, from the ReportWriter listener (inside the batch
+    transaction) or ``flush`` at the end of the crawl.  The listener also
+    deletes the entries of every report the batch stored, so a report
+    that makes it in on a later crawl leaves the table by itself.
+
+    Listing pages given up on are only kept in ``pages``: the crawl does
+    not finish its checkpoint or move its watermark, so the next one
+    lists them again.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.pages = []
+        self.lock = threading.Lock()
+
+    def add(self, page, report, reason, error, attempts):
+        with self.lock:
+            self.pending.append((page, report, reason, error, attempts))
+
+    def add_page(self, page):
+        with self.lock:
+            self.pages.append(page)
+
+    def __call__(self, batch):
+        deadletter.objects.filter(report_id__in=[item[0].report_id for item in batch]).delete()
+        self.save()
+
+    def flush(self):
+        with transaction.atomic():
+            self.save()
+
+    def save(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        now = timezone.now()
+        for page, report, reason, error, attempts in pending:
+            fields = {
+                'listing': json.dumps(report),
+                'page': page,
+                'reason': reason,
+                'error': error,
+                'last_failed': now,
+            }
+            updated = deadletter.objects.filter(report_id=report['id']).update(
+                attempts=F('attempts') + attempts, **fields)
+            if not updated:
+                deadletter.objects.create(report_id=report['id'], attempts=attempts, first_failed=now, **fields)
+
+
+def failed(reasons=None):
+    """The dead-lettered reports as (page, listing entry), oldest failure first."""
+    letters = deadletter.objects.order_by('first_failed', 'report_id')
+    if reasons:
+        letters = letters.filter(reason__in=reasons)
+    return [(letter.page, json.loads(letter.listing)) for letter in letters]
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import re
+
+from django.utils.dateparse import parse_datetime
+
+from report.models import result, dialogue, summar
+
+
+def timestamp(value):
+    # hackerone sends ISO 8601; anything unparsable is stored as NULL
+    if not value:
+        return None
+    try:
+        return parse_datetime(re.sub(r':\s+', ':', value.strip()))
+    except (AttributeError, ValueError):
+        return None
+
+
+def boolean(value):
+    return bool(value)
+
+
+def integer(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def text(value):
+    if isinstance(value, (list, tuple)):
+        return ','.join(map(unicode, value))
+    return unicode(value)
+
+
+def prefix(base):
+    return lambda value: base + value
+
+
+# coercion used when a field in the table does not name one
+COERCE = {
+    'DateTimeField': timestamp,
+    'BooleanField': boolean,
+    'NullBooleanField': boolean,
+    'IntegerField': integer,
+    'FloatField': number,
+    'CharField': text,
+    'TextField': text,
+}
+
+# (model field, JSON path, default, coerce); the default is used when the
+# path is missing or ends at null, coerce defaults to the model field type
+
+LISTING_FIELDS = [
+    ('report_id', 'id', None, None),
+    ('title', 'title', None, None),
+    ('severity_rating', 'severity_rating', 'none', None),
+]
+
+REPORT_FIELDS = [
+    ('state', 'state', 'none', None),
+    ('substate', 'substate', 'none', None),
+    ('created_at', 'created_at', None, None),
+    ('username', 'reporter.username', 'null', None),
+    ('username_url', 'reporter.url', '', prefix('https://hackerone.com')),
+    ('team_name', 'team.handle', None, None),
+    ('team_url', 'team.url', None, None),
+    ('team_about', 'team.profile.about', None, None),
+    ('has_bounty', 'has_bounty?', None, None),
+    ('can_view_team', 'can_view_team', None, None),
+    ('is_external_bug', 'is_external_bug', None, None),
+    ('is_participant', 'is_participant', None, None),
+    ('public', 'public', None, None),
+    ('visibility', 'visibility', None, None),
+    ('cve_ids', 'cve_ids', '', None),
+    ('singular_disclosure_disabled', 'singular_disclosure_disabled', None, None),
+    ('disclosed_at', 'disclosed_at', None, None),
+    ('bug_reporter_agreed_on_going_public_at', 'bug_reporter_agreed_on_going_public_at', None, None),
+    ('team_member_agreed_on_going_public_at', 'team_member_agreed_on_going_public_at', None, None),
+    ('comments_closed', 'comments_closed?', None, None),
+    ('vulnerability_information', 'vulnerability_information', None, None),
+    ('vulnerability_information_html', 'vulnerability_information_html', None, None),
+    ('original_report_id', 'original_report_id', None, None),
+    ('original_report_url', 'original_report_url', None, None),
+    ('allow_singular_disclosure_at', 'allow_singular_disclosure_at', None, None),
+    ('allow_singular_disclosure_after', 'allow_singular_disclosure_after', None, None),
+    ('singular_disclosure_allowed', 'singular_disclosure_allowed', None, None),
+    ('vote_count', 'vote_count', None, None),
+]
+
+SUMMARY_FIELDS = [
+    ('summaries_id', 'id', None, None),
+    ('content', 'content', 'none', None),
+    ('content_html', 'content_html', 'none', None),
+    ('category', 'category', 'none', None),
+    ('can_view', 'can_view?', None, None),
+    ('can_create', 'can_create?', None, None),
+]
+
+ACTIVITY_FIELDS = [
+    ('activity_id', 'id', None, None),
+    ('is_internal', 'is_internal', None, None),
+    ('editable', 'editable', None, None),
+    ('type', 'type', None, None),
+    ('message', 'message', None, None),
+    ('markdown_message', 'markdown_message', None, None),
+    ('automated_response', 'automated_response', None, None),
+    ('created_at', 'created_at', None, None),
+    ('updated_at', 'updated_at', None, None),
+    ('actor_username', 'actor_username', 'none', None),
+    ('actor_url', 'actor_url', 'none', None),
+    ('genius_execution_id', 'genius_execution_id', None, None),
+    ('team_handle', 'team_handle', None, None),
+]
+
+
+class Extractor(object):
+    """Turns one JSON object into keyword arguments for ``model``.
+
+    The field table is compiled once into a single Python function that
+    does every lookup inline, so extracting a payload is one call with no
+    per-field dispatch.  ``source`` keeps the generated code for reading.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        namespace = {}
+        lines = ['def extract(data):', '    kwargs = {}']
+        for n, (name, path, default, coerce) in enumerate(fields):
+            if coerce is None:
+                coerce = COERCE[model._meta.get_field(name).get_internal_type()]
+            namespace['coerce%d' % n] = coerce
+            namespace['default%d' % n] = default
+            lookup = ''.join('[%r]' % str(key) for key in path.split('.'))
+            lines += [
+                '    try:',
+                '        value = data%s' % lookup,
+                '    except (KeyError, TypeError, IndexError):',
+                '        value = None',
+                '    kwargs[%r] = default%d if value is None else coerce%d(value)' % (name, n, n),
+            ]
+        lines.append('    return kwargs')
+        self.source = '\n'.join(lines)
+        exec compile(self.source, '<extractor %s>' % model.__name__, 'exec') in namespace
+        self.extract = namespace['extract']
+
+    def __call__(self, data):
+        return self.extract(data)
+
+
+extract_listing = Extractor(result, LISTING_FIELDS)
+extract_report = Extractor(result, REPORT_FIELDS)
+extract_summary = Extractor(summar, SUMMARY_FIELDS)
+extract_activity = Extractor(dialogue, ACTIVITY_FIELDS)
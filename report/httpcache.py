@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entry (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL,
+    accessed_at REAL,
+    size INTEGER,
+    body BLOB
+)
+'''
+
+
+class HTTPCache(object):
+    """Responses of earlier crawls with their ETag / Last-Modified.
+
+    The crawler sends them back as If-None-Match / If-Modified-Since and
+    gets a body-less 304 when nothing changed.  Entries older than ``ttl``
+    seconds are dropped, and once the stored bodies exceed ``max_bytes``
+    the least recently used ones are evicted.  Kept in its own sqlite
+    file, so cache traffic never competes with the report writer.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 3600, max_bytes=256 << 20):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _open(self):
+        if self.db is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.db.text_factory = str
+            # backfill shards share the file
+            self.db.execute('PRAGMA journal_mode = WAL')
+            self.db.execute('PRAGMA synchronous = NORMAL')
+            self.db.execute(SCHEMA)
+            self.db.execute('CREATE INDEX IF NOT EXISTS entry_accessed ON entry (accessed_at)')
+            self.size = self.db.execute('SELECT coalesce(sum(size), 0) FROM entry').fetchone()[0]
+        return self.db
+
+    def validators(self, url):
+        """Conditional request headers for ``url``, empty when it is not cached."""
+        with self.lock:
+            db = self._open()
+            row = db.execute('SELECT etag, last_modified, stored_at FROM entry WHERE url = ?', (url,)).fetchone()
+            if row is None or row[2] < time.time() - self.ttl:
+                self.misses += 1
+                return {}
+            self.hits += 1
+        headers = {}
+        if row[0]:
+            headers['If-None-Match'] = row[0]
+        if row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def body(self, url):
+        # after a 304: the stored body, and the entry counts as used again
+        with self.lock:
+            db = self._open()
+            self.not_modified += 1
+            db.execute('UPDATE entry SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            db.commit()
+            row = db.execute('SELECT body FROM entry WHERE url = ?', (url,)).fetchone()
+        return str(row[0]) if row else None
+
+    def put(self, url, etag, last_modified, body):
+        if not etag and not last_modified:
+            return  # nothing to revalidate with
+        now = time.time()
+        with self.lock:
+            db = self._open()
+            old = db.execute('SELECT size FROM entry WHERE url = ?', (url,)).fetchone()
+            db.execute('INSERT OR REPLACE INTO entry VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (url, etag, last_modified, now, now, len(body), sqlite3.Binary(body)))
+            self.size += len(body) - (old[0] if old else 0)
+            if self.size > self.max_bytes:
+                self._evict(now)
+            db.commit()
+
+    def forget(self, url):
+        # a response that could not be used must not come back as a 304
+        with self.lock:
+            db = self._open()
+            old = db.execute('SELECT size FROM entry WHERE url = ?', (url,)).fetchone()
+            if old is None:
+                return
+            db.execute('DELETE FROM entry WHERE url = ?', (url,))
+            self.size -= old[0]
+            db.commit()
+
+    def _evict(self, now):
+        db = self.db
+        db.execute('DELETE FROM entry WHERE stored_at < ?', (now - self.ttl,))
+        self.size = db.execute('SELECT coalesce(sum(size), 0) FROM entry').fetchone()[0]
+        target = self.max_bytes * 0.9
+        while self.size > target:
+            rows = db.execute('SELECT url, size FROM entry ORDER BY accessed_at LIMIT 100').fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                db.execute('DELETE FROM entry WHERE url = ?', (url,))
+                self.size -= size
+                if self.size <= target:
+                    break
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'bytes': self.size,
+        }
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import socket
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from report.models import job
+
+ACTIVE = ('queued', 'running')
+JOB_HEARTBEAT = getattr(settings, 'JOB_HEARTBEAT', 30)
+JOB_STALE_AFTER = getattr(settings, 'JOB_STALE_AFTER', 300)
+
+
+def enqueue(kind):
+    # a crawl that is already waiting or running is not queued twice
+    with transaction.atomic():
+        current = job.objects.filter(kind=kind, status__in=ACTIVE).first()
+        if current is not None:
+            return current
+        return job.objects.create(kind=kind)
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def claim(worker=''):
+    for pk in job.objects.filter(status='queued').order_by('pk').values_list('pk', flat=True):
+        # only one worker wins the queued -> running update
+        now = timezone.now()
+        if job.objects.filter(pk=pk, status='queued').update(status='running', start_time=now,
+                                                             worker=worker, heartbeat=now):
+            return job.objects.get(pk=pk)
+    return None
+
+
+def requeue_abandoned(stale_after=JOB_STALE_AFTER):
+    # jobs whose worker stopped sending heartbeats; the crawl checkpoint
+    # lets them resume.  A job another live worker is running is left alone.
+    stale = timezone.now() - datetime.timedelta(seconds=stale_after)
+    return job.objects.filter(Q(heartbeat__lt=stale) | Q(heartbeat__isnull=True), status='running') \
+                      .update(status='queued', worker='')
+
+
+class Heartbeat(object):
+    """Touches ``job.heartbeat`` every ``interval`` seconds from a thread
+    while the job runs, so requeue_abandoned can tell it from a job whose
+    worker died."""
+
+    def __init__(self, current, interval=JOB_HEARTBEAT):
+        self.current = current
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, name='heartbeat')
+        self.thread.daemon = True
+
+    def beat(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                job.objects.filter(pk=self.current.pk, status='running', worker=self.current.worker) \
+                           .update(heartbeat=timezone.now())
+        finally:
+            connection.close()   # this thread's own connection
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run(current):
+    from report import crawl
+
+    def progress(pages, pages_done, reports):
+        current.pages = pages
+        current.pages_done = pages_done
+        current.reports = reports
+        current.requests = crawl.client.requests - first_request
+        current.save(update_fields=['pages', 'pages_done', 'reports', 'requests'])
+
+    first_request = crawl.client.requests
+    try:
+        with Heartbeat(current):
+            if current.kind == 'scrappe':
+                crawl.scrappe(progress)
+            elif current.kind == 'update':
+                crawl.update(progress)
+            elif current.kind == 'refresh':
+                crawl.refresh(progress)
+            else:
+                raise ValueError('unknown job kind %r' % current.kind)
+    except Exception:
+        current.status = 'failed'
+        current.error = traceback.format_exc()
+    else:
+        current.status = 'done'
+    current.requests = crawl.client.requests - first_request
+    current.end_time = timezone.now()
+    current.save()
+    return current
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from report import crawl
+from report.extract import extract_activity, extract_report, extract_summary
+from report.replay import load_fixtures
+
+
+class Command(BaseCommand):
+    help = 'Measure report extraction throughput against the get_content.json fixture.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--number', type=int, default=2000,
+                            help='reports per measurement (default 2000)')
+
+    def handle(self, *args, **options):
+        listing, content = load_fixtures()
+        report = listing['reports'][0]
+        # what a detail worker actually sees: unicode strings from json
+        data = json.loads(json.dumps(content))
+        number = options['number']
+
+        def kwargs_only():
+            extract_report(data)
+            for summarie in data['summaries']:
+                extract_summary(summarie)
+            for activity in data['activities']:
+                extract_activity(activity)
+
+        self.measure('extract (kwargs)', number, kwargs_only)
+        self.measure('parse_report (model instances)', number, lambda: crawl.parse_report(report, data))
+        self.stdout.write('%d activities, %d summaries per report'
+                          % (len(data['activities']), len(data['summaries'])))
+
+    def measure(self, name, number, func):
+        func()   # warm up
+        start = time.time()
+        for i in xrange(number):
+            func()
+        elapsed = time.time() - start
+        self.stdout.write('%-32s %8.0f reports/s  (%.1f us/report)'
+                          % (name, number / elapsed, elapsed / number * 1e6))
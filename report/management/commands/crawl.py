@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from report import crawl
+
+
+class Command(BaseCommand):
+    help = 'Backfill every disclosed report (scrappe), optionally across several processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, default=getattr(settings, 'CRAWL_SHARDS', 1),
+                            help='fetch/parse processes sharing the page range (default: CRAWL_SHARDS)')
+
+    def handle(self, *args, **options):
+        if options['shards'] < 1:
+            raise CommandError('--shards must be at least 1')
+        crawl.scrappe(shards=options['shards'])
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from report import crawl, metrics
+from report.replay import ReplayServer
+
+RESULTS = os.path.join(settings.BASE_DIR, 'bench', 'crawlbench.jsonl')
+# crawl module constants a run points somewhere else, restored afterwards
+PATCHED = ('HACKERONE_URL', 'CRAWL_WORKERS', 'CRAWL_STREAM_JSON', 'CRAWL_ARCHIVE_DIR', 'CRAWL_HTTP_CACHE')
+
+
+class Command(BaseCommand):
+    help = ('Crawl a synthetic feed served by report.replay into a throwaway test database: '
+            'scrappe, then update after new reports appear.  Appends the numbers to a JSONL file '
+            'and compares them with the previous run of the same configuration.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=20, help='listing pages for scrappe (default 20)')
+        parser.add_argument('--per-page', type=int, default=25, help='reports per listing page (default 25)')
+        parser.add_argument('--new', type=int, default=50, help='reports published before update (default 50)')
+        parser.add_argument('--activities', type=int, default=None,
+                            help='activities per report detail, i.e. payload size (default: the fixture\'s)')
+        parser.add_argument('--latency', type=float, default=0.02, help='mean server latency in seconds (default 0.02)')
+        parser.add_argument('--error-rate', type=float, default=0, help='share of details answered with a 500')
+        parser.add_argument('--throttle-rate', type=float, default=0, help='share of requests answered with a 429')
+        parser.add_argument('--rate', type=float, default=1000, help='crawler requests per second (default 1000)')
+        parser.add_argument('--workers', type=int, default=crawl.CRAWL_WORKERS, help='detail workers')
+        parser.add_argument('--shards', type=int, default=1, help='scrappe processes (default 1)')
+        parser.add_argument('--no-stream', action='store_true', help='buffered instead of streamed JSON parsing')
+        parser.add_argument('--seed', type=int, default=1, help='seed for injected latency and errors')
+        parser.add_argument('--label', default='', help='free text stored with the results')
+        parser.add_argument('--output', default=RESULTS, help='results file (default bench/crawlbench.jsonl)')
+
+    def handle(self, *args, **options):
+        if options['pages'] < 1 or options['per_page'] < 1 or options['shards'] < 1:
+            raise CommandError('--pages, --per-page and --shards must be at least 1')
+        config = dict((name, options[name]) for name in (
+            'pages', 'per_page', 'new', 'activities', 'latency', 'error_rate', 'throttle_rate',
+            'rate', 'workers', 'shards', 'no_stream', 'seed'))
+        workdir = tempfile.mkdtemp(prefix='crawlbench-')
+        original = dict((name, getattr(crawl, name)) for name in PATCHED)
+        database = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite':
+            # a file, not the in-memory default: write times should be real ones
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'db.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CRAWL_RATE=options['rate'], CRAWL_MAX_RATE=options['rate'],
+                                   CRAWL_BURST=max(options['workers'], 1),
+                                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+                runs = self.bench(options, workdir)
+        finally:
+            for name, value in original.items():
+                setattr(crawl, name, value)
+            crawl.connect()
+            connection.creation.destroy_test_db(database, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+        self.save(options['output'], config, options['label'], runs)
+
+    def bench(self, options, workdir):
+        crawl.CRAWL_WORKERS = options['workers']
+        crawl.CRAWL_STREAM_JSON = not options['no_stream']
+        crawl.CRAWL_ARCHIVE_DIR = os.path.join(workdir, 'archive') if original_set('CRAWL_ARCHIVE_DIR') else None
+        crawl.CRAWL_HTTP_CACHE = os.path.join(workdir, 'httpcache.sqlite3') if original_set('CRAWL_HTTP_CACHE') else None
+        server_options = dict(pages=options['pages'], per_page=options['per_page'],
+                              activities=options['activities'], latency=options['latency'],
+                              error_rate=options['error_rate'], throttle_rate=options['throttle_rate'],
+                              seed=options['seed'])
+        runs = []
+        port = 0
+        for name, new in (('scrappe', 0), ('update', options['new'])):
+            # the server forks: nothing the crawl opened may be shared with it
+            connections.close_all()
+            crawl.client.close()
+            server = ReplayServer(port, new=new, **server_options).start(process=True)
+            port = server.server_address[1]
+            crawl.HACKERONE_URL = server.url
+            crawl.connect()
+            try:
+                runs.append(self.run(name, options['shards']))
+            finally:
+                server.stop()
+        return runs
+
+    def run(self, name, shards):
+        metrics.REGISTRY.reset()
+        requests = crawl.client.requests
+        start = time.time()
+        if name == 'scrappe':
+            crawl.scrappe(shards=shards)
+        else:
+            crawl.update()
+        elapsed = time.time() - start
+        snapshot = metrics.REGISTRY.snapshot()
+
+        def total(metric):
+            # a counter, over all its labels
+            return sum(value for key, value in snapshot[metric]['values'])
+
+        def observed(metric):
+            # a histogram: (sum, count) over all its labels
+            values = [value for key, value in snapshot[metric]['values']]
+            return sum(value[1] for value in values), sum(value[2] for value in values)
+
+        written = total('crawl_reports_written_total')
+        write_seconds, batches = observed('crawl_write_seconds')
+        latency = snapshot['crawl_request_seconds']
+        return {
+            'run': name,
+            'reports': written,
+            'seconds': round(elapsed, 3),
+            'reports_per_second': round(written / elapsed, 1) if elapsed else None,
+            'requests': crawl.client.requests - requests,
+            'connections_opened': total('crawl_connections_opened_total'),
+            'retries': total('crawl_retries_total'),
+            'failed': total('crawl_reports_failed_total'),
+            'detail_p50_ms': milliseconds(metrics.quantile(latency, 0.5, ('detail',))),
+            'detail_p99_ms': milliseconds(metrics.quantile(latency, 0.99, ('detail',))),
+            'parse_seconds': round(observed('crawl_parse_seconds')[0], 3),
+            'write_seconds': round(write_seconds, 3),
+            'batches': batches,
+            # peaks so far, in this process and in the shard processes it waited for
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+            'children_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0, 1),
+        }
+
+    def save(self, path, config, label, runs):
+        previous = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry['config'] == config:
+                        previous[entry['run']['run']] = entry
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'a') as f:
+            for run in runs:
+                f.write(json.dumps({
+                    'time': timezone.now().isoformat(),
+                    'commit': git_commit(),
+                    'python': platform.python_version(),
+                    'label': label,
+                    'config': config,
+                    'run': run,
+                }, sort_keys=True) + '\n')
+        for run in runs:
+            self.stdout.write('%(run)-8s %(reports)5d reports in %(seconds)7.2fs  %(reports_per_second)8.1f reports/s  '
+                              'p50 %(detail_p50_ms)s ms  p99 %(detail_p99_ms)s ms  write %(write_seconds).2fs  '
+                              'peak rss %(peak_rss_mb).0f MB' % run)
+            before = previous.get(run['run'])
+            if before and before['run']['reports_per_second'] and run['reports_per_second']:
+                change = run['reports_per_second'] / before['run']['reports_per_second'] - 1
+                self.stdout.write('         %+.1f%% reports/s against %s (%s)'
+                                  % (change * 100, before['commit'] or 'unknown commit', before['time']))
+        self.stdout.write('results appended to %s' % path)
+
+
+def original_set(name):
+    # archive and HTTP cache are part of the crawl cost when they are configured
+    return bool(getattr(settings, name, None))
+
+
+def milliseconds(value):
+    return round(value * 1000, 1) if value is not None else None
+
+
+def git_commit():
+    with open(os.devnull, 'w') as devnull:
+        try:
+            return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                           cwd=settings.BASE_DIR, stderr=devnull).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
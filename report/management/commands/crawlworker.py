@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from report import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued crawl jobs (scrappe / update) outside the web server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='exit when the queue is empty instead of polling')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='seconds between polls of an empty queue')
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        while True:
+            # what requests do for the web server: drop connections past
+            # CONN_MAX_AGE or broken by a database restart
+            close_old_connections()
+            # on every poll: a worker that dies is taken over by one still running
+            requeued = jobs.requeue_abandoned()
+            if requeued:
+                self.stdout.write('requeued %d abandoned job(s)' % requeued)
+            current = jobs.claim(worker)
+            if current is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+            self.stdout.write('job %d: %s' % (current.pk, current.kind))
+            current = jobs.run(current)
+            self.stdout.write('job %d: %s, %d reports, %.2f requests/s'
+                              % (current.pk, current.status, current.reports, current.requests_per_second()))
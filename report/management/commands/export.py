@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from report import columnar
+
+
+class Command(BaseCommand):
+    help = 'Append reports changed since the last run to a Parquet/Arrow export.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=getattr(settings, 'EXPORT_DIR', None),
+                            help='export directory (default: EXPORT_DIR)')
+        parser.add_argument('--format', choices=sorted(columnar.SUFFIX), default='parquet')
+        parser.add_argument('--full', action='store_true',
+                            help='drop the existing parts and export every report again')
+        parser.add_argument('--batch-size', type=int, default=columnar.EXPORT_BATCH_SIZE,
+                            help='reports per record batch (at most 999)')
+
+    def handle(self, *args, **options):
+        if columnar.pyarrow is None:
+            raise CommandError('pyarrow is not installed: pip install pyarrow')
+        if not options['dir']:
+            raise CommandError('no export directory, set EXPORT_DIR or pass --dir')
+        start = time.time()
+        try:
+            part = columnar.export(options['dir'], options['format'], options['full'], options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if part is None:
+            self.stdout.write('nothing changed since the last export')
+            return
+        self.stdout.write('part %(part)d: %(result)d reports, %(summar)d summaries, %(dialogue)d activities'
+                          % dict(part['rows'], part=part['part']) + ' in %.1fs' % (time.time() - start))
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from report import assets
+
+
+class Command(BaseCommand):
+    help = 'Download the attachments and embedded images crawled reports point at into ASSET_DIR.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='also try the downloads that failed before')
+
+    def handle(self, *args, **options):
+        if not assets.ASSET_DIR:
+            raise CommandError('ASSET_DIR is not set')
+        start = time.time()
+        done, failed = assets.mirror(options['retry_failed'])
+        self.stdout.write('mirrored %d assets in %.1fs, %d failed' % (done, time.time() - start, failed))
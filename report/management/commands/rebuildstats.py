@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from report import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the aggregate statistics tables from result.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='only compare the stored aggregates with a fresh count, exit 1 on a difference')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        if not options['check']:
+            counts = stats.rebuild()
+            self.stdout.write('rebuilt %d aggregates in %.1fs' % (len(counts), time.time() - start))
+            return
+        fresh = dict((key, value) for key, value in stats.compute().items() if any(value))
+        current = stats.stored()
+        differences = sorted(key for key in set(fresh) | set(current) if fresh.get(key) != current.get(key))
+        for dimension, key in differences:
+            self.stdout.write('%s %r: stored %s, counted %s' % (dimension, key, current.get((dimension, key)),
+                                                                 fresh.get((dimension, key))))
+        if differences:
+            raise CommandError('%d aggregate(s) differ, run rebuildstats' % len(differences))
+        self.stdout.write('%d aggregates match (%.1fs)' % (len(fresh), time.time() - start))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+
+from report.crawl import redrive
+from report.models import deadletter
+
+REASONS = ('transient', 'ratelimited', 'permanent')
+
+
+class Command(BaseCommand):
+    help = 'Fetch the reports in the dead-letter table again, and nothing else.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reason', action='append', choices=REASONS,
+                            help='only entries that failed for this reason (repeatable, default: all)')
+        parser.add_argument('--list', action='store_true',
+                            help='show the dead-lettered reports instead of fetching them')
+
+    def handle(self, *args, **options):
+        letters = deadletter.objects.order_by('first_failed', 'report_id')
+        if options['reason']:
+            letters = letters.filter(reason__in=options['reason'])
+        if options['list']:
+            for letter in letters:
+                self.stdout.write('%d\t%s\t%d\t%s\t%s' % (letter.report_id, letter.reason, letter.attempts,
+                                                           letter.last_failed.isoformat(), letter.error))
+            return
+        start = time.time()
+        written, failed = redrive(options['reason'])
+        self.stdout.write('re-drove %d reports in %.1fs, %d still failing'
+                          % (written + failed, time.time() - start, failed))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from report.archive import Archive
+from report.crawl import reingest
+
+
+class Command(BaseCommand):
+    help = 'Rebuild result/dialogue/summar from the raw response archive, offline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive', default=getattr(settings, 'CRAWL_ARCHIVE_DIR', None),
+                            help='archive directory (default: CRAWL_ARCHIVE_DIR)')
+        parser.add_argument('--clear', action='store_true',
+                            help='delete every stored report before re-ingesting')
+
+    def handle(self, *args, **options):
+        if not options['archive']:
+            raise CommandError('no archive directory, set CRAWL_ARCHIVE_DIR or pass --archive')
+        start = time.time()
+        written = reingest(Archive(options['archive']), options['clear'])
+        self.stdout.write('re-ingested %d reports in %.1fs' % (written, time.time() - start))
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger('report.crawl')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# finer, so manage.py crawlbench gets usable p50/p99 out of them
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03, 0.04, 0.05, 0.075,
+                   0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 30)
+PUBLISHED = 'metrics:crawler'
+PUBLISH_INTERVAL = 1.0
+
+
+class Metric(object):
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels) if labels else ()
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        # a total another object keeps (connection pools, the HTTP cache)
+        key = self.key(labels) if labels else ()
+        with self.lock:
+            self.values[key] = value
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    """Fixed buckets, like a Prometheus histogram: observing a value is a
+    bisect and three additions under a lock."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels) if labels else ()
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), [list(counts), total, count]]
+                    for key, (counts, total, count) in self.values.items()]
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = []
+        self.attached = {}
+        self.collectors = []
+        self.published = 0
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        # called before every snapshot, to copy totals kept elsewhere into counters
+        self.collectors.append(func)
+        return func
+
+    def snapshot(self):
+        for func in self.collectors:
+            func()
+        own = dict((m.name, {
+            'type': m.type,
+            'help': m.help,
+            'labels': list(m.labels),
+            'buckets': list(getattr(m, 'buckets', ())),
+            'values': m.snapshot(),
+        }) for m in self.metrics)
+        return merge([own] + self.attached.values())
+
+    def attach(self, source, snapshot):
+        # metrics of another process (a backfill shard) reported to this one
+        self.attached[source] = snapshot
+
+    def publish(self, snapshot=None, force=False):
+        """Put the snapshot where the web process can read it."""
+        now = time.time()
+        if not force and now - self.published < PUBLISH_INTERVAL:
+            return
+        self.published = now
+        cache.set(PUBLISHED, {'pid': os.getpid(), 'metrics': snapshot or self.snapshot()}, None)
+
+    def collect(self):
+        """The crawler's metrics, as last published, plus this process's
+        own (the report cache counters of a web server)."""
+        published = cache.get(PUBLISHED)
+        if not published or published['pid'] == os.getpid():
+            return self.snapshot()
+        return merge([published['metrics'], self.snapshot()])
+
+    def reset(self):
+        # a forked shard starts from zero, its parent already counts the rest
+        for metric in self.metrics:
+            with metric.lock:
+                metric.values = {}
+        self.attached = {}
+
+
+def merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, values=[]))
+            values = dict((tuple(key), value) for key, value in target['values'])
+            for key, value in metric['values']:
+                key = tuple(key)
+                if key not in values:
+                    values[key] = value
+                elif metric['type'] == 'counter':
+                    values[key] = values[key] + value
+                else:
+                    counts, total, count = values[key]
+                    values[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1], count + value[2]]
+            target['values'] = [[list(key), value] for key, value in values.items()]
+    return merged
+
+
+def render(snapshot):
+    """Prometheus text exposition format."""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append('# HELP %s %s' % (name, metric['help']))
+        lines.append('# TYPE %s %s' % (name, metric['type']))
+        for key, value in sorted(metric['values']):
+            labels = zip(metric['labels'], key)
+            if metric['type'] == 'counter':
+                lines.append('%s%s %s' % (name, label_text(labels), value))
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket in zip(metric['buckets'] + ['+Inf'], counts):
+                cumulative += bucket
+                lines.append('%s_bucket%s %d' % (name, label_text(labels + [('le', bound)]), cumulative))
+            lines.append('%s_sum%s %r' % (name, label_text(labels), total))
+            lines.append('%s_count%s %d' % (name, label_text(labels), count))
+    return '\n'.join(lines) + '\n'
+
+
+def label_text(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, value) for name, value in labels)
+
+
+def quantile(metric, fraction, key=()):
+    """Estimated ``fraction`` quantile of one series of a histogram
+    snapshot, interpolated inside its bucket like PromQL's
+    histogram_quantile.  None when nothing was observed."""
+    series = dict((tuple(k), value) for k, value in metric['values']).get(tuple(key))
+    if not series or not series[2]:
+        return None
+    counts, total, count = series
+    rank = fraction * count
+    seen = 0
+    lower = 0.0
+    for bound, bucket in zip(metric['buckets'], counts):
+        if bucket and seen + bucket >= rank:
+            return lower + (bound - lower) * (rank - seen) / bucket
+        seen += bucket
+        lower = bound
+    return lower   # in the +Inf bucket: all we know is the last bound
+
+
+def totals(snapshot):
+    # flat numbers for the per-batch log line
+    flat = {}
+    for name, metric in snapshot.items():
+        for key, value in metric['values']:
+            label = name + ''.join('.%s' % part for part in key)
+            if metric['type'] == 'counter':
+                flat[label] = value
+            else:
+                flat[label + '.count'] = value[2]
+                flat[label + '.sum'] = round(value[1], 3)
+    return flat
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram('crawl_request_seconds', 'Time to the headers of a hackerone response.', ('kind',),
+                                     LATENCY_BUCKETS)
+RATELIMIT_SECONDS = REGISTRY.histogram('crawl_ratelimit_wait_seconds', 'Time spent waiting for a rate limiter token.')
+PARSE_SECONDS = REGISTRY.histogram('crawl_parse_seconds', 'JSON decoding (and, streamed, extraction) time, socket reads excluded.', ('kind',))
+WRITE_SECONDS = REGISTRY.histogram('crawl_write_seconds', 'Duration of one ReportWriter batch transaction.')
+HTTP_RESPONSES = REGISTRY.counter('crawl_http_responses_total', 'HTTP responses by status code.', ('status',))
+RETRIES = REGISTRY.counter('crawl_retries_total', 'Requests retried after 429/503, or a detail fetch retried after a transient error.')
+REPORTS_FETCHED = REGISTRY.counter('crawl_reports_fetched_total', 'Report details fetched and parsed.')
+REPORTS_SKIPPED = REGISTRY.counter('crawl_reports_skipped_total', 'Reports not fetched or not written.', ('reason',))
+REPORTS_FAILED = REGISTRY.counter('crawl_reports_failed_total', 'Report details given up on and dead-lettered.', ('reason',))
+LISTING_PAGES_FAILED = REGISTRY.counter('crawl_listing_pages_failed_total', 'Listing pages given up on; the next crawl lists them again.')
+REPORTS_WRITTEN = REGISTRY.counter('crawl_reports_written_total', 'Reports committed to the database.')
+CONNECTIONS_OPENED = REGISTRY.counter('crawl_connections_opened_total', 'Keep-alive connections opened to hackerone.')
+CONNECTIONS_REUSED = REGISTRY.counter('crawl_connections_reused_total', 'Requests sent over an already open connection.')
+HTTP_CACHE_LOOKUPS = REGISTRY.counter('crawl_http_cache_lookups_total', 'HTTP cache lookups for conditional requests.', ('result',))
+HTTP_CACHE_NOT_MODIFIED = REGISTRY.counter('crawl_http_cache_not_modified_total', '304 answers served from the HTTP cache.')
+REPORT_CACHE = REGISTRY.counter('report_cache_requests_total', 'Rendered report page lookups.', ('result',))
+
+
+def batch_written(number, count, seconds):
+    """Called by ReportWriter after every committed batch."""
+    WRITE_SECONDS.observe(seconds)
+    REPORTS_WRITTEN.inc(count)
+    snapshot = REGISTRY.snapshot()
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(dict(totals(snapshot), event='batch', batch=number, reports=count,
+                                    write_seconds=round(seconds, 4), time=round(time.time(), 3)),
+                               sort_keys=True))
+    REGISTRY.publish(snapshot)
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-18 16:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0008_auto_20171110_1537'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='crawlstate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True)),
+                ('pages', models.IntegerField(default=0)),
+                ('last_page', models.IntegerField(default=0)),
+                ('ingested', models.TextField(blank=True, default='')),
+                ('finished', models.BooleanField(default=False)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import ast
+import re
+
+from django.db import migrations
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# Everything below was stored as text by the old crawler ("True", "none",
+# "2017-04-27T21: 33: 50.504Z", "[u'CVE-2017-1000']" ...).  Rewrite each value
+# into something the typed columns of 0012 can take over as-is.
+
+BOOLEANS = {
+    'result': ['has_bounty', 'can_view_team', 'is_external_bug', 'is_participant', 'public',
+               'singular_disclosure_disabled', 'comments_closed', 'singular_disclosure_allowed'],
+    'dialogue': ['is_internal', 'editable', 'automated_response'],
+    'summar': ['can_view', 'can_create'],
+}
+DATETIMES = {
+    'result': ['created_at', 'disclosed_at', 'bug_reporter_agreed_on_going_public_at',
+               'team_member_agreed_on_going_public_at', 'allow_singular_disclosure_at'],
+    'dialogue': ['created_at', 'updated_at'],
+}
+INTEGERS = {
+    'result': ['report_id', 'original_report_id', 'vote_count'],
+    'dialogue': ['report_id', 'activity_id'],
+    'summar': ['report_id', 'summaries_id'],
+    'summary': ['pages', 'total_reports'],
+}
+FLOATS = {
+    'result': ['allow_singular_disclosure_after'],
+}
+
+
+def to_boolean(value):
+    value = (value or '').strip().lower()
+    if value in ('true', '1'):
+        return '1'
+    if value in ('false', '0'):
+        return '0'
+    return None
+
+
+def to_datetime(value):
+    value = parse_datetime(re.sub(r':\s+', ':', (value or '').strip()))
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    # naive UTC is what Django itself writes into sqlite datetime columns
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def to_integer(value):
+    value = (value or '').strip()
+    return value if value.lstrip('-').isdigit() else None
+
+
+def to_float(value):
+    try:
+        return repr(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def to_cve_ids(value):
+    try:
+        return ','.join(ast.literal_eval(value or '[]'))
+    except (SyntaxError, ValueError):
+        return value
+
+
+def normalize(apps, schema_editor):
+    result = apps.get_model('report', 'result')
+    # report_id becomes a unique integer; keep the newest copy of duplicates
+    seen = set()
+    for pk, report_id in result.objects.order_by('-pk').values_list('pk', 'report_id'):
+        report_id = to_integer(report_id)
+        if report_id is None or report_id in seen:
+            result.objects.filter(pk=pk).delete()
+        else:
+            seen.add(report_id)
+    converters = [(BOOLEANS, to_boolean), (DATETIMES, to_datetime),
+                  (INTEGERS, to_integer), (FLOATS, to_float)]
+    for name in ('result', 'dialogue', 'summar', 'summary'):
+        model = apps.get_model('report', name)
+        fields = [(field, convert) for table, convert in converters for field in table.get(name, [])]
+        if name == 'result':
+            fields.append(('cve_ids', to_cve_ids))
+        for row in model.objects.values('pk', *[field for field, convert in fields]).iterator():
+            values = dict((field, convert(row[field])) for field, convert in fields)
+            if any(values[field] != row[field] for field in values):
+                model.objects.filter(pk=row['pk']).update(**values)
+    # children of reports that were never stored keep their rows, unlinked
+    for name in ('dialogue', 'summar'):
+        model = apps.get_model('report', name)
+        orphans = set(model.objects.values_list('report_id', flat=True).distinct()) - seen - set([None])
+        orphans = list(orphans)
+        for start in range(0, len(orphans), 500):
+            model.objects.filter(report_id__in=orphans[start:start + 500]).update(report_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0010_crawlstate_watermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize, migrations.RunPython.noop),
+    ]
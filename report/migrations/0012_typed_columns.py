@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0011_normalize_values'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='result',
+            name='report_id',
+            field=models.IntegerField(unique=True),
+        ),
+        migrations.RenameField(
+            model_name='dialogue',
+            old_name='report_id',
+            new_name='report',
+        ),
+        migrations.AlterField(
+            model_name='dialogue',
+            name='report',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dialogues', to='report.result', to_field='report_id'),
+        ),
+        migrations.RenameField(
+            model_name='summar',
+            old_name='report_id',
+            new_name='report',
+        ),
+        migrations.AlterField(
+            model_name='summar',
+            name='report',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='report.result', to_field='report_id'),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='allow_singular_disclosure_after',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='allow_singular_disclosure_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='bug_reporter_agreed_on_going_public_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='can_view_team',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='comments_closed',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='disclosed_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='has_bounty',
+            field=models.NullBooleanField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='is_external_bug',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='is_participant',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='original_report_id',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='public',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='severity_rating',
+            field=models.CharField(db_index=True, default='', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='singular_disclosure_allowed',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='singular_disclosure_disabled',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='state',
+            field=models.CharField(db_index=True, default='', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='substate',
+            field=models.CharField(db_index=True, default='', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='team_member_agreed_on_going_public_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='team_name',
+            field=models.CharField(db_index=True, default='', max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='vote_count',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dialogue',
+            name='activity_id',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dialogue',
+            name='automated_response',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='dialogue',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='dialogue',
+            name='editable',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='dialogue',
+            name='is_internal',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='dialogue',
+            name='type',
+            field=models.CharField(default='', max_length=60, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dialogue',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='summar',
+            name='can_create',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='summar',
+            name='can_view',
+            field=models.NullBooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='summar',
+            name='summaries_id',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='summary',
+            name='create_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='summary',
+            name='pages',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='summary',
+            name='total_reports',
+            field=models.IntegerField(null=True),
+        ),
+    ]
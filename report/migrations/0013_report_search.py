@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+CREATE_SQL = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS report_search
+USING fts5(title, body, summaries, activities, tokenize='porter unicode61')
+'''
+
+FILL_SQL = '''
+INSERT INTO report_search (rowid, title, body, summaries, activities)
+SELECT r.report_id, coalesce(r.title, ''), coalesce(r.vulnerability_information, ''),
+       coalesce((SELECT group_concat(s.content, char(10)) FROM report_summar s WHERE s.report_id = r.report_id), ''),
+       coalesce((SELECT group_concat(d.message, char(10)) FROM report_dialogue d WHERE d.report_id = r.report_id), '')
+FROM report_result r
+'''
+
+
+def create_index(apps, schema_editor):
+    # only sqlite gets an FTS5 table, other databases use report.search.LikeBackend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(FILL_SQL)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS report_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0012_typed_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
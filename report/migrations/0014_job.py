@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-18 16:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0013_report_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('status', models.CharField(db_index=True, default='queued', max_length=20)),
+                ('pages', models.IntegerField(default=0)),
+                ('pages_done', models.IntegerField(default=0)),
+                ('reports', models.IntegerField(default=0)),
+                ('requests', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('create_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('start_time', models.DateTimeField(null=True)),
+                ('end_time', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
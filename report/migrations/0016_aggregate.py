@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-18 17:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill(apps, schema_editor):
+    # existing reports are counted once here; the crawler keeps it up to date
+    from report.stats import rebuild
+    rebuild(source=apps.get_model('report', 'result'), target=apps.get_model('report', 'aggregate'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0015_result_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='aggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('key', models.CharField(blank=True, max_length=100)),
+                ('reports', models.IntegerField(default=0)),
+                ('bounties', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='aggregate',
+            unique_together=set([('dimension', 'key')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='aggregate',
+            index_together=set([('dimension', 'reports')]),
+        ),
+        migrations.RunPython(fill, migrations.RunPython.noop),
+    ]
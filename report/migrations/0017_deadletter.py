@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-18 17:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0016_aggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='deadletter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_id', models.IntegerField(unique=True)),
+                ('listing', models.TextField()),
+                ('page', models.IntegerField(null=True)),
+                ('reason', models.CharField(db_index=True, max_length=20)),
+                ('error', models.TextField(blank=True, default='')),
+                ('attempts', models.IntegerField(default=0)),
+                ('first_failed', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_failed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
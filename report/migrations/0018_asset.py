@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-18 17:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0017_deadletter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='asset',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_id', models.IntegerField(db_index=True)),
+                ('key', models.CharField(max_length=100)),
+                ('url', models.TextField()),
+                ('file_name', models.CharField(blank=True, default='', max_length=255)),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('sha256', models.CharField(blank=True, db_index=True, default='', max_length=64)),
+                ('size', models.IntegerField(null=True)),
+                ('status', models.CharField(db_index=True, default='pending', max_length=20)),
+                ('error', models.TextField(blank=True, default='')),
+                ('fetched_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='asset',
+            unique_together=set([('report_id', 'key')]),
+        ),
+    ]
@@ -1,56 +1,57 @@
 from __future__ import unicode_literals
 
 from django.db import models
-import datetime
+from django.utils import timezone
 # Create your models here.
 class result(models.Model):
-    report_id = models.CharField(max_length=20,default='',null=True)
+    report_id = models.IntegerField(unique=True)
     title = models.CharField(max_length=100,default='',null=True)
     url = models.CharField(max_length=100,default='',null=True)
     username = models.CharField(max_length=100,default='',null=True)
     username_url = models.CharField(max_length=100,default='',null=True)
-    state = models.CharField(max_length=20,default='',null=True)
-    substate = models.CharField(max_length=20,default='',null=True)
-    severity_rating = models.CharField(max_length=20,default='',null=True)
-    created_at = models.CharField(max_length=40,default='',null=True)
-    team_name = models.CharField(max_length=100,default='',null=True)
+    state = models.CharField(max_length=20,default='',null=True,db_index=True)
+    substate = models.CharField(max_length=20,default='',null=True,db_index=True)
+    severity_rating = models.CharField(max_length=20,default='',null=True,db_index=True)
+    created_at = models.DateTimeField(null=True,db_index=True)
+    team_name = models.CharField(max_length=100,default='',null=True,db_index=True)
     team_url = models.CharField(max_length=40,default='',null=True)
     team_about = models.TextField(default='',null=True)
-    has_bounty = models.CharField(max_length=20,default='',null=True)
-    can_view_team = models.CharField(max_length=20,default='',null=True)
-    is_external_bug = models.CharField(max_length=20,default='',null=True)
-    is_participant = models.CharField(max_length=20,default='',null=True)
-    public = models.CharField(max_length=20,default='',null=True)
+    has_bounty = models.NullBooleanField(db_index=True)
+    can_view_team = models.NullBooleanField()
+    is_external_bug = models.NullBooleanField()
+    is_participant = models.NullBooleanField()
+    public = models.NullBooleanField()
     visibility = models.CharField(max_length=20,default='',null=True)
     cve_ids = models.CharField(max_length=40,default='',null=True)
-    singular_disclosure_disabled = models.CharField(max_length=40,default='',null=True)
-    disclosed_at = models.CharField(max_length=40,default='',null=True)
-    bug_reporter_agreed_on_going_public_at = models.CharField(max_length=40,default='',null=True)
-    team_member_agreed_on_going_public_at = models.CharField(max_length=40,default='',null=True)
-    comments_closed = models.CharField(max_length=40,default='',null=True)
+    singular_disclosure_disabled = models.NullBooleanField()
+    disclosed_at = models.DateTimeField(null=True,db_index=True)
+    bug_reporter_agreed_on_going_public_at = models.DateTimeField(null=True)
+    team_member_agreed_on_going_public_at = models.DateTimeField(null=True)
+    comments_closed = models.NullBooleanField()
     vulnerability_information = models.TextField(default='',null=True)
     vulnerability_information_html = models.TextField(default='',null=True)
-    original_report_id = models.CharField(max_length=40,null=True)
+    original_report_id = models.IntegerField(null=True)
     original_report_url= models.CharField(max_length=40,null=True)
-    allow_singular_disclosure_at = models.CharField(max_length=40,default='',null=True)
-    allow_singular_disclosure_after = models.CharField(max_length=40,default='',null=True)
-    singular_disclosure_allowed = models.CharField(max_length=40,default='',null=True)
-    vote_count = models.CharField(max_length=40,default='',null=True)
+    allow_singular_disclosure_at = models.DateTimeField(null=True)
+    allow_singular_disclosure_after = models.FloatField(null=True)
+    singular_disclosure_allowed = models.NullBooleanField()
+    vote_count = models.IntegerField(null=True,db_index=True)
+    modified = models.DateTimeField(auto_now=True,db_index=True)   # last write by the crawler, for incremental exports
     def __unicode__(self): 
         return self.title
 
     
 class dialogue(models.Model):
-    report_id = models.CharField(max_length=10,default='',null=True)
-    activity_id = models.CharField(max_length=10,default='',null=True)
-    is_internal = models.CharField(max_length=10,default='',null=True)
-    editable = models.CharField(max_length=10,default='',null=True)
-    type =  models.CharField(max_length=10,default='',null=True)
+    report = models.ForeignKey(result,to_field='report_id',related_name='dialogues',null=True)
+    activity_id = models.IntegerField(null=True,db_index=True)
+    is_internal = models.NullBooleanField()
+    editable = models.NullBooleanField()
+    type =  models.CharField(max_length=60,default='',null=True)
     message = models.TextField(default='',null=True)
     markdown_message = models.TextField(default='',null=True)
-    automated_response = models.CharField(max_length=10,default='',null=True)
-    created_at = models.CharField(max_length=40,default='',null=True)
-    updated_at = models.CharField(max_length=40,default='',null=True)
+    automated_response = models.NullBooleanField()
+    created_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(null=True)
     actor_username = models.CharField(max_length=40,default='',null=True)
     actor_url = models.CharField(max_length=40,default='',null=True)
     genius_execution_id = models.CharField(max_length=40,null=True)
@@ -58,14 +59,70 @@ class dialogue(models.Model):
     
 
 class summary(models.Model):
-    pages = models.CharField(max_length=30,default='',null=True)
-    total_reports = models.CharField(max_length=30,default='',null=True)
-    create_time = models.DateTimeField(default=datetime.datetime.now())
+    pages = models.IntegerField(null=True)
+    total_reports = models.IntegerField(null=True)
+    create_time = models.DateTimeField(default=timezone.now)
 class summar(models.Model):              
-    report_id = models.CharField(max_length=20,null=True)
-    summaries_id = models.CharField(max_length=30,default='',null=True)
+    report = models.ForeignKey(result,to_field='report_id',related_name='summaries',null=True)
+    summaries_id = models.IntegerField(null=True)
     content = models.TextField(default='',null=True)
     content_html = models.TextField(default='',null=True)
     category = models.CharField(max_length=30,default='',null=True)
-    can_view = models.CharField(max_length=30,default='',null=True)
-    can_create = models.CharField(max_length=30,default='',null=True)
\ No newline at end of file
+    can_view = models.NullBooleanField()
+    can_create = models.NullBooleanField()
+class crawlstate(models.Model):
+    name = models.CharField(max_length=20,unique=True)
+    pages = models.IntegerField(default=0)
+    last_page = models.IntegerField(default=0)          # every report up to this page is stored
+    ingested = models.TextField(default='',blank=True)  # report ids stored from later pages
+    finished = models.BooleanField(default=False)
+    watermark = models.DateTimeField(null=True,blank=True)   # newest latest_disclosable_activity_at synced
+    update_time = models.DateTimeField(auto_now=True)
+class job(models.Model):
+    kind = models.CharField(max_length=20)                       # scrappe / update
+    status = models.CharField(max_length=20,default='queued',db_index=True)   # queued, running, done, failed
+    pages = models.IntegerField(default=0)
+    pages_done = models.IntegerField(default=0)
+    reports = models.IntegerField(default=0)                     # reports ingested
+    requests = models.IntegerField(default=0)                    # http requests made
+    error = models.TextField(default='',blank=True)
+    create_time = models.DateTimeField(default=timezone.now)
+    start_time = models.DateTimeField(null=True)
+    end_time = models.DateTimeField(null=True)
+    worker = models.CharField(max_length=100,default='',blank=True)   # host:pid of the crawlworker running it
+    heartbeat = models.DateTimeField(null=True)                      # touched by that worker while it runs
+    def requests_per_second(self):
+        if not self.start_time:
+            return 0
+        elapsed = ((self.end_time or timezone.now()) - self.start_time).total_seconds()
+        return self.requests / elapsed if elapsed > 0 else 0
+class aggregate(models.Model):
+    dimension = models.CharField(max_length=20)      # total, team, severity, state, month, latency
+    key = models.CharField(max_length=100,blank=True)   # team handle, severity, YYYY-MM, latency in days ...
+    reports = models.IntegerField(default=0)
+    bounties = models.IntegerField(default=0)        # reports with has_bounty
+    class Meta:
+        unique_together = (('dimension', 'key'),)
+        index_together = (('dimension', 'reports'),)
+class deadletter(models.Model):
+    report_id = models.IntegerField(unique=True)
+    listing = models.TextField()                     # the hacktivity entry, json; redrive needs it
+    page = models.IntegerField(null=True)
+    reason = models.CharField(max_length=20,db_index=True)   # transient, ratelimited, permanent
+    error = models.TextField(default='',blank=True)
+    attempts = models.IntegerField(default=0)        # over every crawl that tried it
+    first_failed = models.DateTimeField(default=timezone.now)
+    last_failed = models.DateTimeField(default=timezone.now)
+class asset(models.Model):
+    report_id = models.IntegerField(db_index=True)
+    key = models.CharField(max_length=100)           # attachment:<id>, or url:<sha1 of an embedded url>
+    url = models.TextField()                         # where it was last seen; attachment urls expire
+    file_name = models.CharField(max_length=255,default='',blank=True)
+    content_type = models.CharField(max_length=100,default='',blank=True)
+    sha256 = models.CharField(max_length=64,default='',blank=True,db_index=True)   # blob in ASSET_DIR
+    size = models.IntegerField(null=True)
+    status = models.CharField(max_length=20,default='pending',db_index=True)   # pending, done, failed
+    error = models.TextField(default='',blank=True)
+    fetched_at = models.DateTimeField(null=True)
+    class Meta:
+        unique_together = (('report_id', 'key'),)
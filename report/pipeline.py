@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import Queue
+import sys
+import threading
+import time
+
+STOP = object()
+
+
+class Stage(object):
+    """One step of the crawl: ``func(item)`` yields items for the next stage.
+
+    Stages are chained through bounded queues, so a slow stage makes the
+    ones in front of it wait instead of piling up memory.  When the last
+    worker of a stage exits it sends one STOP to every worker downstream.
+    After a failure the failed stage and everything before it only drain
+    their queues; later stages finish what is already in flight.
+    """
+
+    def __init__(self, name, func, workers=1, maxsize=0):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = Queue.Queue(maxsize)
+        self.next = None
+        self.position = 0
+        self.running = workers
+        self.done = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def work(self, pipeline):
+        while True:
+            item = self.inbox.get()
+            if item is STOP:
+                break
+            if pipeline.failed_at is not None and pipeline.failed_at >= self.position:
+                continue  # drain so nobody upstream blocks on a full queue
+            start = time.time()
+            try:
+                for out in self.func(item) or ():
+                    self.next.inbox.put(out)
+            except Exception:
+                pipeline.fail(self, sys.exc_info())
+            with self.lock:
+                self.done += 1
+                self.busy += time.time() - start
+        with self.lock:
+            self.running -= 1
+            last = self.running == 0
+        if last and self.next is not None:
+            for n in range(self.next.workers):
+                self.next.inbox.put(STOP)
+
+    def stats(self, elapsed):
+        return {
+            'stage': self.name,
+            'done': self.done,
+            'rate': self.done / elapsed if elapsed else 0,
+            'busy': self.busy,
+            'queue': self.inbox.qsize(),
+        }
+
+
+class Pipeline(object):
+    """Runs stages in threads, except the last one which runs in the caller.
+
+    Keeping the sink in the calling thread means only one thread ever
+    writes to the database.
+    """
+
+    def __init__(self, stages, report=None, interval=10):
+        self.stages = stages
+        for stage, downstream in zip(stages, stages[1:]):
+            stage.next = downstream
+        for position, stage in enumerate(stages):
+            stage.position = position
+        self.report = report
+        self.interval = interval
+        self.error = None
+        self.failed_at = None
+        self.started = None
+
+    def fail(self, stage, exc_info):
+        if self.error is None:
+            self.error = exc_info
+            self.failed_at = stage.position
+
+    def stats(self):
+        elapsed = time.time() - self.started
+        return [stage.stats(elapsed) for stage in self.stages]
+
+    def run(self, items):
+        self.started = time.time()
+        sink = self.stages[-1]
+        # fed from a thread of its own once every stage runs: filling a
+        # bounded first inbox from here, before any worker takes from
+        # it, would block for good on the item after maxsize
+        feeder = threading.Thread(target=self.feed, args=(items,), name='feed')
+        feeder.daemon = True
+        threads = [feeder]
+        for stage in self.stages[:-1]:
+            for n in range(stage.workers):
+                thread = threading.Thread(target=stage.work, args=(self,),
+                                          name='%s-%d' % (stage.name, n))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+        feeder.start()
+        if self.report is not None:
+            ticker = threading.Thread(target=self.tick)
+            ticker.daemon = True
+            ticker.start()
+        sink.work(self)
+        for thread in threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+
+    def feed(self, items):
+        source = self.stages[0]
+        try:
+            for item in items:
+                source.inbox.put(item)
+        except Exception:
+            self.fail(source, sys.exc_info())
+        for n in range(source.workers):
+            source.inbox.put(STOP)
+
+    def tick(self):
+        while True:
+            time.sleep(self.interval)
+            if all(stage.running == 0 for stage in self.stages):
+                return
+            self.report(self.stats())
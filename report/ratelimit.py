@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+class TokenBucket(object):
+    """Shared request budget for all crawler threads.
+
+    Tokens refill at ``rate`` per second up to ``burst``.  A 429/503 from
+    hackerone halves the rate (and honours Retry-After), every successful
+    response adds ``step`` back until ``max_rate`` is reached again.
+    """
+
+    def __init__(self, rate, burst=1, min_rate=0.1, max_rate=None, step=0.05):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate or rate)
+        self.step = float(step)
+        self.tokens = self.burst
+        self.stamp = time.time()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.time()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def throttle(self, retry_after=None):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.time() + retry_after)
+
+    def recover(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.step)
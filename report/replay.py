@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Local stand-in for hackerone.com that replays get_url.json / get_content.json.
+
+    python -m report.replay 8000 [throttle_rate] [pages]
+    HACKERONE_URL=http://127.0.0.1:8000 python manage.py shell
+
+With ``pages`` it serves a synthetic feed of that many listing pages
+instead of the single fixture page (see ReplayServer).
+"""
+import ast
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_fixtures():
+    with open(os.path.join(BASE_DIR, 'get_url.json')) as f:
+        listing = json.load(f)
+    # get_content.json was saved as a python repr, not as json
+    with open(os.path.join(BASE_DIR, 'get_content.json')) as f:
+        content = ast.literal_eval(f.read())
+    return listing, content
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like hackerone
+    disable_nagle_algorithm = True   # headers and body go out in separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        if status == 200:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(random.uniform(0.5, 1.5) * server.latency)
+        if server.throttle_rate and random.random() < server.throttle_rate:
+            server.throttled += 1
+            return self.send_json(429, '{}', [('Retry-After', '1')])
+        server.served += 1
+        match = re.match(r'^/reports/(\d+)', self.path)
+        if match:
+            if server.error_rate and random.random() < server.error_rate:
+                server.errors += 1
+                return self.send_json(500, '{}')
+            return self.send_json(200, server.detail(int(match.group(1))))
+        if self.path.startswith('/hacktivity'):
+            match = re.search(r'[?&]page=(\d+)', self.path)
+            return self.send_json(200, server.listing_page(int(match.group(1)) if match else 1))
+        self.send_json(404, '{}')
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+    """Serves the fixtures, or with ``pages`` a synthetic feed.
+
+    The synthetic feed has ``pages * per_page + new`` reports, newest
+    first, each shaped like the fixtures: report ``n`` (0 is the oldest)
+    has id ``FIRST_ID + n`` and the same content on every run, so a
+    server started again with a larger ``new`` looks like hackerone a
+    while later.  ``activities`` sets how many activities a detail has
+    (the payload size), ``latency`` the mean seconds before an answer and
+    ``error_rate`` the share of details answered with a 500.
+    """
+
+    daemon_threads = True
+    FIRST_ID = 100000
+    EPOCH = datetime.datetime(2017, 1, 1)
+
+    def __init__(self, port=0, throttle_rate=0, pages=None, per_page=25, new=0,
+                 activities=None, latency=0, error_rate=0, seed=None):
+        HTTPServer.__init__(self, ('127.0.0.1', port), ReplayHandler)
+        self.listing, self.content = load_fixtures()
+        self.listing_body = json.dumps(self.listing)
+        self.throttle_rate = throttle_rate
+        self.pages = pages
+        self.per_page = per_page
+        self.total = pages * per_page + new if pages else 0
+        if activities is not None:
+            template = self.content['activities']
+            self.content = dict(self.content, activities=[
+                dict(template[n % len(template)], id=n + 1) for n in range(activities)])
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.process = None
+        self.served = 0
+        self.throttled = 0
+        self.errors = 0
+        self.not_modified = 0
+
+    def listing_page(self, page):
+        if not self.pages:
+            return self.listing_body
+        template = self.listing['reports'][0]
+        first = self.total - (page - 1) * self.per_page - 1
+        reports = []
+        for n in range(first, max(first - self.per_page, -1), -1):
+            report_id = self.FIRST_ID + n
+            reports.append(dict(template, id=report_id, url='/reports/%d' % report_id,
+                                title='%s #%d' % (template['title'], report_id),
+                                latest_disclosable_activity_at=self.disclosed(n)))
+        return json.dumps(dict(self.listing, reports=reports, count=self.total,
+                               pages=-(-self.total // self.per_page)))
+
+    def detail(self, report_id):
+        if not self.pages:
+            return json.dumps(dict(self.content, id=report_id))
+        n = report_id - self.FIRST_ID
+        return json.dumps(dict(self.content, id=report_id,
+                               title='%s #%d' % (self.content['title'], report_id),
+                               disclosed_at=self.disclosed(n)))
+
+    def disclosed(self, n):
+        return (self.EPOCH + datetime.timedelta(minutes=n)).isoformat() + '.000Z'
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def start(self, process=False):
+        """Serve from a thread, or from a child process so that building
+        responses does not compete with the crawler for the GIL (the
+        counters then stay in the child)."""
+        if process:
+            self.process = multiprocessing.Process(target=self.serve_child, name='replay')
+            self.process.daemon = True
+            self.process.start()
+            return self
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def serve_child(self):
+        random.seed(self.seed)
+        self.serve_forever()
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+        else:
+            self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    throttle_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    pages = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    server = ReplayServer(port, throttle_rate, pages)
+    print 'replaying hackerone on %s' % server.url
+    server.serve_forever()
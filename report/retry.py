@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import httplib
+import random
+import socket
+import sys
+import time
+
+import requests
+
+from report.metrics import RETRIES
+
+# exceptions that say nothing about the report itself: try again later
+NETWORK_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+    requests.packages.urllib3.exceptions.HTTPError,   # raised by streamed reads
+    httplib.HTTPException,
+    socket.error,
+)
+
+
+class FetchError(Exception):
+    """A report detail that could not be fetched or parsed.
+
+    ``reason`` is one of ``transient`` (network trouble, 5xx), ``ratelimited``
+    (429/503 after every retry of crawl.request) or ``permanent`` (4xx, or a
+    body that does not parse); only the first two are worth retrying.
+    """
+
+    reason = 'permanent'
+
+    def __init__(self, message, attempts=1):
+        Exception.__init__(self, message)
+        self.attempts = attempts
+
+
+class TransientError(FetchError):
+    reason = 'transient'
+
+
+class RateLimited(FetchError):
+    reason = 'ratelimited'
+
+
+class PermanentError(FetchError):
+    reason = 'permanent'
+
+
+def classify(exc):
+    if isinstance(exc, FetchError):
+        return exc
+    try:
+        message = '%s: %s' % (exc.__class__.__name__, exc)
+    except UnicodeError:
+        message = repr(exc)
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        if status in (429, 503):
+            return RateLimited(message)
+        if status >= 500 or status == 408:
+            return TransientError(message)
+        return PermanentError(message)
+    if isinstance(exc, NETWORK_ERRORS):
+        return TransientError(message)
+    # a body that is not JSON (ValueError, JSONError) or lacks what
+    # parse_report expects (KeyError, TypeError ...): retrying would fail
+    # the same way
+    return PermanentError(message)
+
+
+def backoff(attempt, base=1.0, cap=60.0):
+    # "full jitter": workers that failed together do not retry together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retrying(func, attempts=4, base=1.0, cap=60.0):
+    """``func()``, again after a growing random pause while it fails with a
+    transient error.  Whatever it finally raises comes out classified, as
+    a FetchError with the original traceback."""
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception as e:
+            tb = sys.exc_info()[2]
+            error = classify(e)
+            error.attempts = attempt + 1
+            if error.reason == 'permanent' or attempt + 1 == attempts:
+                raise error, None, tb
+            RETRIES.inc()
+        time.sleep(backoff(attempt, base, cap))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from report.models import result, dialogue, summar
+
+WEIGHTS = (10.0, 2.0, 4.0, 1.0)   # title, report body, summaries, activities
+
+
+class LikeBackend(object):
+    """Fallback for databases without a full-text index: plain icontains."""
+
+    def index_batch(self, batch):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, key, offset=0, limit=25):
+        reports = result.objects.filter(
+            Q(title__icontains=key) |
+            Q(vulnerability_information__icontains=key) |
+            Q(report_id__in=summar.objects.filter(content__icontains=key).values('report_id')) |
+            Q(report_id__in=dialogue.objects.filter(message__icontains=key).values('report_id'))
+        ).order_by('-report_id')
+        return list(reports[offset:offset + limit]), reports.count()
+
+
+class SqliteFTSBackend(object):
+    """SQLite FTS5 index of titles, report bodies, summaries and activity
+    messages, one row per report with rowid = report_id.
+
+    The table is created by migration 0013; ReportWriter keeps it in sync
+    through index_batch, and results come back ordered by bm25.
+    """
+
+    table = 'report_search'
+
+    def index_batch(self, batch):
+        rows = {}
+        for row, summaries, activities, page in batch:
+            rows[row.report_id] = (
+                row.report_id,
+                row.title or '',
+                row.vulnerability_information or '',
+                '\n'.join(s.content or '' for s in summaries),
+                '\n'.join(a.message or '' for a in activities),
+            )
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % self.table,
+                               [(report_id,) for report_id in rows])
+            cursor.executemany('INSERT INTO %s (rowid, title, body, summaries, activities) '
+                               'VALUES (%%s, %%s, %%s, %%s, %%s)' % self.table, rows.values())
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % self.table)
+            cursor.execute(REBUILD_SQL % self.table)
+
+    def match(self, key):
+        # every word must appear somewhere; quoting keeps FTS5 syntax out of user input
+        words = re.findall(r'\w+', key, re.UNICODE)
+        return ' '.join('"%s"' % word for word in words)
+
+    def search(self, key, offset=0, limit=25):
+        match = self.match(key)
+        if not match:
+            return [], 0
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM %s WHERE %s MATCH %%s' % (self.table, self.table), [match])
+            total = cursor.fetchone()[0]
+            cursor.execute('SELECT rowid FROM %s WHERE %s MATCH %%s ORDER BY bm25(%s, %s) LIMIT %%s OFFSET %%s'
+                           % (self.table, self.table, self.table, ', '.join(map(str, WEIGHTS))),
+                           [match, limit, offset])
+            ids = [report_id for report_id, in cursor.fetchall()]
+        reports = dict((r.report_id, r) for r in
+                       result.objects.filter(report_id__in=ids).only('report_id', 'title'))
+        return [reports[report_id] for report_id in ids if report_id in reports], total
+
+
+REBUILD_SQL = '''
+INSERT INTO %s (rowid, title, body, summaries, activities)
+SELECT r.report_id, coalesce(r.title, ''), coalesce(r.vulnerability_information, ''),
+       coalesce((SELECT group_concat(s.content, char(10)) FROM report_summar s WHERE s.report_id = r.report_id), ''),
+       coalesce((SELECT group_concat(d.message, char(10)) FROM report_dialogue d WHERE d.report_id = r.report_id), '')
+FROM report_result r
+'''
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        default = 'report.search.SqliteFTSBackend'
+    else:
+        default = 'report.search.LikeBackend'
+    return import_string(getattr(settings, 'SEARCH_BACKEND', default))()
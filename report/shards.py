@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import Queue
+import time
+import traceback
+
+from django.db import connections
+
+from report import crawl, metrics
+from report.deadletter import DeadLetters
+from report.pipeline import Pipeline, Stage
+from report.store import ReportWriter
+
+
+def split(first_page, pages, shards):
+    # contiguous page ranges, as even as possible, none of them empty
+    count = pages - first_page + 1
+    ranges = []
+    start = first_page
+    for shard in range(shards):
+        size = count // shards + (1 if shard < count % shards else 0)
+        if size:
+            ranges.append(range(start, start + size))
+        start += size
+    return ranges
+
+
+class ShardCheckpoint(object):
+    """Stands in for the Checkpoint inside a shard process: what the
+    listing and detail stages tell it is forwarded to the parent, which
+    owns the real one."""
+
+    def __init__(self, shard, queue):
+        self.shard = shard
+        self.queue = queue
+
+    def expect(self, page, count):
+        self.queue.put(('page', self.shard, page, count, crawl.client.requests,
+                        metrics.REGISTRY.snapshot()))
+
+    def unchanged(self, page):
+        self.queue.put(('unchanged', self.shard, page))
+
+
+class ShardDeadLetters(object):
+    # the same for DeadLetters: failures are stored by the parent
+
+    def __init__(self, shard, queue):
+        self.shard = shard
+        self.queue = queue
+
+    def add(self, page, report, reason, error, attempts):
+        self.queue.put(('failed', self.shard, page, report, reason, error, attempts))
+
+    def add_page(self, page):
+        self.queue.put(('page failed', self.shard, page))
+
+
+def run_shard(shard, shards, pages, known, watermark, queue):
+    try:
+        # nothing opened by the parent (sockets, sqlite handles) is reused
+        crawl.connect(share=1.0 / shards, name='shard%d' % shard)
+        metrics.REGISTRY.reset()
+        checkpoint = ShardCheckpoint(shard, queue)
+        stages = crawl.fetch_stages(known, checkpoint, watermark, ShardDeadLetters(shard, queue))
+        stages.append(Stage('send', lambda item: queue.put(('report', shard) + tuple(item)),
+                            1, crawl.CRAWL_QUEUE_SIZE))
+        try:
+            Pipeline(stages).run(pages)
+        finally:
+            if crawl.archive:
+                crawl.archive.flush()
+        queue.put(('done', shard, watermark.newest if watermark else None, crawl.client.requests,
+                   metrics.REGISTRY.snapshot()))
+    except Exception:
+        queue.put(('error', shard, traceback.format_exc()))
+
+
+class Shard(object):
+
+    def __init__(self, number, pages):
+        self.number = number
+        self.pages = pages
+        self.pages_done = 0
+        self.reports = 0
+        self.requests = 0
+        self.finished = False
+        self.process = None
+
+
+def backfill(pages, shards, checkpoint=None, watermark=None, progress=None, interval=10):
+    """scrappe() spread over ``shards`` processes.
+
+    Each process fetches and parses a contiguous range of listing pages
+    and sends the parsed reports over one queue to this process, the only
+    one that writes to the database (and owns the checkpoint).  The
+    request rate is split evenly between the shards.
+    """
+    first_page = checkpoint.first_page if checkpoint else 1
+    known = crawl.known_reports()
+    failures = DeadLetters()
+    listeners = crawl.batch_listeners() + [failures]
+    if checkpoint:
+        listeners.append(checkpoint.commit)
+    writer = ReportWriter(crawl.CRAWL_BATCH_SIZE, listeners)
+    ranges = split(first_page, pages, shards)
+    queue = multiprocessing.Queue(crawl.CRAWL_QUEUE_SIZE * max(len(ranges), 1))
+    # children inherit open handles on fork; none of them may be shared
+    connections.close_all()
+    crawl.client.close()
+    if crawl.http_cache:
+        crawl.http_cache.close()
+    if crawl.archive:
+        crawl.archive.flush()
+    state = [Shard(number, len(r)) for number, r in enumerate(ranges)]
+    for shard, r in zip(state, ranges):
+        shard.process = multiprocessing.Process(target=run_shard, name='shard-%d' % shard.number,
+                                                args=(shard.number, len(ranges), r, known, watermark, queue))
+        shard.process.daemon = True
+        shard.process.start()
+    started = last_report = time.time()
+    running = len(state)
+    try:
+        while running:
+            try:
+                message = queue.get(timeout=1)
+            except Queue.Empty:
+                for shard in state:
+                    if not shard.finished and not shard.process.is_alive():
+                        raise RuntimeError('shard %d exited with code %s'
+                                           % (shard.number, shard.process.exitcode))
+                message = None
+            if message is not None:
+                kind, shard = message[0], state[message[1]]
+                if kind == 'report':
+                    writer.add(*message[2:])
+                    shard.reports += 1
+                elif kind == 'page':
+                    page, count, requests, snapshot = message[2:]
+                    if checkpoint:
+                        checkpoint.expect(page, count)
+                    shard.pages_done += 1
+                    count_requests(shard, requests)
+                    metrics.REGISTRY.attach('shard%d' % shard.number, snapshot)
+                elif kind == 'unchanged':
+                    if checkpoint:
+                        checkpoint.unchanged(message[2])
+                elif kind == 'failed':
+                    failures.add(*message[2:])
+                elif kind == 'page failed':
+                    failures.add_page(message[2])
+                elif kind == 'done':
+                    newest, requests, snapshot = message[2:]
+                    if watermark and newest is not None and (watermark.newest is None or newest > watermark.newest):
+                        watermark.newest = newest
+                    count_requests(shard, requests)
+                    metrics.REGISTRY.attach('shard%d' % shard.number, snapshot)
+                    shard.finished = True
+                    running -= 1
+                elif kind == 'error':
+                    raise RuntimeError('shard %d failed:\n%s' % (shard.number, message[2]))
+            if time.time() - last_report >= interval:
+                last_report = time.time()
+                print_progress(state, writer, last_report - started)
+                if progress:
+                    progress(pages, first_page - 1 + sum(s.pages_done for s in state), writer.written)
+    finally:
+        writer.flush()   # keep whatever was fetched before a failure
+        failures.flush()
+        metrics.REGISTRY.publish(force=True)
+        for shard in state:
+            if shard.process.is_alive():
+                shard.process.terminate()
+            shard.process.join()
+    crawl.finish(failures, checkpoint, watermark)
+    if progress:
+        progress(pages, pages, writer.written)
+    print_progress(state, writer, time.time() - started)
+    print 'ingested %d reports (write %.1fs, last batch %.3fs)' % (writer.written, writer.write_time, writer.last_write_time)
+    crawl.print_connection_stats()
+    crawl.mirror_assets()
+
+
+def count_requests(shard, requests):
+    # the parent's client total includes every shard, for job.requests
+    with crawl.client.lock:
+        crawl.client.requests += requests - shard.requests
+    shard.requests = requests
+
+
+def print_progress(state, writer, elapsed):
+    shards = ' | '.join('shard %d %d/%dp %dr' % (s.number, s.pages_done, s.pages, s.reports) for s in state)
+    print '%s | written %d %.1f/s' % (shards, writer.written, writer.written / elapsed if elapsed else 0)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from report.models import aggregate, result
+
+# result columns a report's contribution is computed from
+COLUMNS = ('team_name', 'severity_rating', 'state', 'has_bounty', 'created_at', 'disclosed_at')
+
+
+def tally(reports, sign=1, counts=None):
+    """Add (or with ``sign=-1`` remove) what each report contributes to
+    every dimension: ``{(dimension, key): [reports, bounties]}``.
+
+    ``reports`` yields tuples in COLUMNS order.  Latency is in whole days
+    from created_at to disclosed_at, so medians come out of the
+    histogram exactly to the day.
+    """
+    if counts is None:
+        counts = {}
+    for team_name, severity_rating, state, has_bounty, created_at, disclosed_at in reports:
+        keys = [
+            ('total', ''),
+            ('team', team_name or ''),
+            ('severity', severity_rating or 'none'),
+            ('state', state or ''),
+            ('month', month(disclosed_at)),
+        ]
+        if created_at and disclosed_at:
+            keys.append(('latency', str(max((disclosed_at - created_at).days, 0))))
+        for key in keys:
+            count = counts.setdefault(key, [0, 0])
+            count[0] += sign
+            count[1] += sign if has_bounty else 0
+    return counts
+
+
+def month(value):
+    # in UTC, whichever zone the datetime came in
+    if not value:
+        return ''
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y-%m')
+
+
+def apply(counts, model=aggregate):
+    for (dimension, key), (reports, bounties) in counts.items():
+        if not reports and not bounties:
+            continue
+        updated = model.objects.filter(dimension=dimension, key=key).update(
+            reports=F('reports') + reports, bounties=F('bounties') + bounties)
+        if not updated:
+            model.objects.create(dimension=dimension, key=key, reports=reports, bounties=bounties)
+
+
+class StatsUpdater(object):
+    """ReportWriter listener keeping the aggregate table in step with
+    result, inside the batch transaction.
+
+    ``before`` runs ahead of the writes and takes back what the stored
+    versions of the batch's reports contributed; the listener call then
+    adds the new versions.
+    """
+
+    def __init__(self):
+        self.counts = {}
+
+    def before(self, items):
+        ids = [row.report_id for row, summaries, activities, page in items]
+        stored = result.objects.filter(report_id__in=ids).values_list(*COLUMNS)
+        self.counts = tally(stored, -1)
+
+    def __call__(self, batch):
+        # same rule as the writer: a report twice in one batch counts once, as its last copy
+        rows = dict((item[0].report_id, item[0]) for item in batch)
+        counts = tally(([getattr(row, name) for name in COLUMNS] for row in rows.values()),
+                       1, self.counts)
+        apply(counts)
+        self.counts = {}
+
+
+def rebuild(chunk_size=2000, source=result, target=aggregate):
+    """Recompute every aggregate from result, in one transaction.
+    (``source`` and ``target`` are swapped for historical models by the
+    migration that introduced the table.)"""
+    counts = compute(chunk_size, source)
+    with transaction.atomic():
+        target.objects.all().delete()
+        target.objects.bulk_create([
+            target(dimension=dimension, key=key, reports=reports, bounties=bounties)
+            for (dimension, key), (reports, bounties) in counts.items() if reports or bounties])
+    return counts
+
+
+def compute(chunk_size=2000, source=result):
+    counts = {}
+    last = None
+    while True:
+        chunk = source.objects.order_by('report_id')
+        if last is not None:
+            chunk = chunk.filter(report_id__gt=last)
+        rows = list(chunk.values_list('report_id', *COLUMNS)[:chunk_size])
+        if not rows:
+            return counts
+        tally((row[1:] for row in rows), 1, counts)
+        last = rows[-1][0]
+
+
+def stored():
+    return dict(((a.dimension, a.key), [a.reports, a.bounties])
+                for a in aggregate.objects.all() if a.reports or a.bounties)
+
+
+def percentile(histogram, fraction):
+    # histogram: [(days, reports)] sorted by days
+    total = sum(count for days, count in histogram)
+    if not total:
+        return None
+    seen = 0
+    for days, count in histogram:
+        seen += count
+        if seen >= total * fraction:
+            return days
+
+
+def overview(top=50):
+    """Everything the stats view shows, from a handful of small queries."""
+    def dimension(name):
+        return aggregate.objects.filter(dimension=name, reports__gt=0)
+    total = dimension('total').first()
+    latency = sorted((int(a.key), a.reports) for a in dimension('latency'))
+    return {
+        'reports': total.reports if total else 0,
+        'bounties': total.bounties if total else 0,
+        'teams': [{'team': a.key, 'reports': a.reports, 'bounties': a.bounties}
+                  for a in dimension('team').order_by('-reports', 'key')[:top]],
+        'severity': dict((a.key, a.reports) for a in dimension('severity')),
+        'state': dict((a.key, a.reports) for a in dimension('state')),
+        'months': [{'month': a.key or None, 'reports': a.reports, 'bounties': a.bounties}
+                   for a in dimension('month').order_by('key')],
+        'disclosure_latency_days': {
+            'reports': sum(count for days, count in latency),
+            'median': percentile(latency, 0.5),
+            'p90': percentile(latency, 0.9),
+            'histogram': latency_buckets(latency),
+        },
+    }
+
+
+BUCKETS = ((1, '<1d'), (7, '1-7d'), (30, '7-30d'), (90, '30-90d'), (365, '90-365d'), (None, '>365d'))
+
+
+def latency_buckets(latency):
+    buckets = [[label, 0] for limit, label in BUCKETS]
+    for days, count in latency:
+        for n, (limit, label) in enumerate(BUCKETS):
+            if limit is None or days < limit:
+                buckets[n][1] += count
+                break
+    return [{'bucket': label, 'reports': count} for label, count in buckets]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from report import metrics
+from report.models import result, dialogue, summar
+
+
+class ReportWriter(object):
+    """Collects crawled reports and writes them in one transaction per batch.
+
+    Reports that are already stored are deleted with their summaries and
+    activities, then the whole batch is inserted with bulk_create.  Every
+    listener is called with the deduped items inside the same
+    transaction, so whatever it records commits or rolls back with the
+    reports; a listener with a ``before`` method also gets them ahead of
+    the writes, while the old rows are still there.
+    """
+
+    def __init__(self, batch_size=25, listeners=()):
+        self.batch_size = batch_size
+        self.listeners = list(listeners)
+        self.pending = []
+        self.batches = 0
+        self.written = 0
+        self.last_write_time = 0
+        self.write_time = 0
+
+    def add(self, row, summaries, activities, page=None):
+        self.pending.append((row, summaries, activities, page))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return 0
+        start = time.time()
+        batch = self.pending
+        # a report seen twice in one batch (the listing shifted) is kept once
+        latest = dict((item[0].report_id, item) for item in batch)
+        items = [item for item in batch if latest[item[0].report_id] is item]
+        rows = [item[0] for item in items]
+        ids = [row.report_id for row in rows]
+        now = timezone.now()
+        for row in rows:
+            row.modified = now
+        with transaction.atomic():
+            for listener in self.listeners:
+                # listeners that need the stored versions look before the writes
+                if hasattr(listener, 'before'):
+                    listener.before(items)
+            # a stored report is replaced whole: one delete per table and
+            # one insert for the batch, instead of an UPDATE per report
+            summar.objects.filter(report_id__in=ids).delete()
+            dialogue.objects.filter(report_id__in=ids).delete()
+            result.objects.filter(report_id__in=ids).delete()
+            result.objects.bulk_create(rows)
+            summar.objects.bulk_create([s for item in items for s in item[1]])
+            dialogue.objects.bulk_create([a for item in items for a in item[2]])
+            for listener in self.listeners:
+                listener(items)
+        count = len(items)
+        self.pending = []
+        self.batches += 1
+        self.written += count
+        self.last_write_time = time.time() - start
+        self.write_time += self.last_write_time
+        metrics.batch_written(self.batches, count, self.last_write_time)
+        return count
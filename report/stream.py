@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import tempfile
+import time
+
+# only a C backend: ijson's pure python one parses many times slower
+# than json.load, which (reading the same socket) is the fallback
+try:
+    from ijson.backends import yajl2_c as ijson
+except ImportError:
+    try:
+        from ijson.backends import yajl2_cffi as ijson
+    except ImportError:
+        ijson = None
+
+STREAMED = {
+    'activities': 'activity',
+    'summaries': 'summary',
+}
+
+
+def iter_report(fileobj):
+    """Parse a report detail document as a stream of events.
+
+    Yields ``('activity', dict)`` and ``('summary', dict)`` for every
+    element of the two arrays, then ``('report', dict)`` with all other
+    top-level fields (the two arrays left empty) once the document ends.
+    With ijson each top-level field is built by the C backend as soon as
+    it has been read off the socket, so parsing overlaps the download;
+    per-event python code (ijson.parse plus ObjectBuilder) cost more
+    than the overlap saved.
+    """
+    if ijson is None:
+        fields = json.load(fileobj).iteritems()
+    else:
+        fields = ijson.kvitems(fileobj, '')
+    report = {}
+    for name, value in fields:
+        kind = STREAMED.get(name)
+        if kind is None:
+            report[name] = value
+            continue
+        for item in value or ():
+            yield kind, item
+        report[name] = []
+    yield 'report', report
+
+
+class Tee(object):
+    """File-like view of a response body that hashes what is read and,
+    when ``spool`` is set, copies it to a temporary file (in memory up to
+    1MB, on disk beyond) for the archive."""
+
+    def __init__(self, raw, spool=False):
+        self.raw = raw
+        self.sha1 = hashlib.sha1()
+        self.spool = tempfile.SpooledTemporaryFile(1 << 20) if spool else None
+        self.read_time = 0.0   # spent waiting on the socket, not parsing
+
+    def read(self, size=-1):
+        start = time.time()
+        chunk = self.raw.read(size)
+        self.read_time += time.time() - start
+        self.sha1.update(chunk)
+        if self.spool is not None:
+            self.spool.write(chunk)
+        return chunk
+
+    @property
+    def digest(self):
+        return self.sha1.hexdigest()
@@ -1,3 +1,432 @@
-from django.test import TestCase
+# -*- coding: utf-8 -*-
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 
-# Create your tests here.
+import requests
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import captured_stdout, override_settings
+
+from report import assets, crawl
+from report.checkpoint import Checkpoint
+from report.assets import Mirror
+from report.deadletter import DeadLetters, failed
+from report.models import asset, crawlstate, deadletter, dialogue, result, summar
+from report.pipeline import Pipeline, Stage
+from report.ratelimit import TokenBucket
+from report.replay import ReplayServer
+from report.retry import PermanentError, TransientError, classify, retrying
+from report.store import ReportWriter
+
+# crawl module constants the crawl tests point somewhere else
+PATCHED = ('HACKERONE_URL', 'CRAWL_STREAM_JSON', 'CRAWL_ARCHIVE_DIR', 'CRAWL_HTTP_CACHE')
+
+
+@override_settings(CRAWL_RATE=1000, CRAWL_MAX_RATE=1000, CRAWL_BURST=4,
+                   # fewer connections than listing pages: one that is never
+                   # given back to the pool hangs the crawl
+                   CRAWL_POOL_PER_HOST=2,
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CrawlTest(TransactionTestCase):
+    """The whole crawler against report.replay, with an HTTP cache."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='crawltest-')
+        self.original = dict((name, getattr(crawl, name)) for name in PATCHED)
+        self.server = ReplayServer(pages=6, per_page=2).start()
+        crawl.HACKERONE_URL = self.server.url
+        crawl.CRAWL_ARCHIVE_DIR = None
+        crawl.CRAWL_HTTP_CACHE = self.workdir + '/httpcache.sqlite3'
+        crawl.connect()
+
+    def tearDown(self):
+        crawl.client.close()
+        crawl.http_cache.close()
+        self.server.stop()
+        for name, value in self.original.items():
+            setattr(crawl, name, value)
+        crawl.connect()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def crawl(self, func, timeout=60):
+        # in a thread, so that a crawl that hangs fails the test instead
+        errors = []
+
+        def target():
+            try:
+                with captured_stdout():
+                    func()
+            except Exception as e:
+                errors.append(e)
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        thread.join(timeout)
+        self.assertFalse(thread.is_alive(), '%s did not finish in %ds' % (func.__name__, timeout))
+        if errors:
+            raise errors[0]
+
+    def test_scrappe_twice_then_update(self):
+        self.crawl(crawl.scrappe)
+        self.assertEqual(result.objects.count(), 12)
+        self.assertEqual(dialogue.objects.filter(report_id=ReplayServer.FIRST_ID).count(),
+                         len(self.server.content['activities']))
+        # every listing page answers 304 now
+        self.crawl(crawl.scrappe)
+        self.assertEqual(result.objects.count(), 12)
+        self.assertGreaterEqual(self.server.not_modified, 6)
+        self.server.total += 3   # newly published reports
+        self.crawl(crawl.update)
+        self.assertEqual(result.objects.count(), 15)
+        self.assertTrue(result.objects.filter(report_id=ReplayServer.FIRST_ID + 14).exists())
+
+    def test_streamed_details(self):
+        crawl.CRAWL_STREAM_JSON = True
+        self.crawl(crawl.scrappe)
+        self.assertEqual(result.objects.count(), 12)
+        self.assertEqual(dialogue.objects.filter(report_id=ReplayServer.FIRST_ID).count(),
+                         len(self.server.content['activities']))
+        self.assertEqual(summar.objects.filter(report_id=ReplayServer.FIRST_ID).count(),
+                         len(self.server.content['summaries']))
+
+    def test_unstored_reports_are_fetched_despite_cached_validators(self):
+        self.crawl(crawl.scrappe)
+        # a wiped database next to the HTTP cache of the crawl that filled it
+        dialogue.objects.all().delete()
+        summar.objects.all().delete()
+        result.objects.all().delete()
+        crawlstate.objects.all().delete()
+        self.crawl(crawl.scrappe)
+        self.assertEqual(result.objects.count(), 12)
+
+    def test_refresh_skips_unchanged_details(self):
+        self.crawl(crawl.scrappe)
+        served = self.server.not_modified
+        self.crawl(crawl.refresh)
+        # the first listing page, all six pages and twelve details
+        self.assertEqual(self.server.not_modified - served, 19)
+        self.assertEqual(result.objects.count(), 12)
+
+    def test_failed_listing_page_is_listed_again(self):
+        listing_page = self.server.listing_page
+        self.server.listing_page = lambda page: '{' if page == 3 else listing_page(page)
+        self.crawl(crawl.scrappe)
+        self.assertEqual(result.objects.count(), 10)
+        state = crawlstate.objects.get(name='scrappe')
+        self.assertEqual((state.last_page, state.finished), (2, False))
+        self.server.listing_page = listing_page
+        self.crawl(crawl.scrappe)
+        self.assertEqual(result.objects.count(), 12)
+        self.assertTrue(crawlstate.objects.get(name='scrappe').finished)
+
+    def test_redrive_more_reports_than_the_queue_holds(self):
+        for n in range(crawl.CRAWL_QUEUE_SIZE + 10):
+            report_id = ReplayServer.FIRST_ID + n
+            deadletter.objects.create(report_id=report_id, page=1, reason='transient', attempts=4,
+                                      listing=json.dumps({'id': report_id, 'url': '/reports/%d' % report_id,
+                                                          'title': 'report %d' % report_id}))
+        self.crawl(crawl.redrive)
+        self.assertEqual(result.objects.count(), crawl.CRAWL_QUEUE_SIZE + 10)
+        self.assertFalse(deadletter.objects.exists())
+
+
+class PipelineTest(TestCase):
+
+    def run_pipeline(self, stages, items, timeout=10):
+        # in a thread, like CrawlTest.crawl; returns what run() raised
+        errors = []
+
+        def target():
+            try:
+                Pipeline(stages).run(items)
+            except Exception as e:
+                errors.append(e)
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        thread.join(timeout)
+        self.assertFalse(thread.is_alive(), 'pipeline did not finish in %ds' % timeout)
+        return errors[0] if errors else None
+
+    def test_more_items_than_the_queues_hold(self):
+        out = []
+        self.run_pipeline([Stage('double', lambda n: [n * 2], 4, 2),
+                           Stage('collect', lambda n: out.append(n), 1, 2)], range(100))
+        self.assertEqual(sorted(out), range(0, 200, 2))
+
+    def test_failure_still_drains(self):
+        def fail(n):
+            if n == 3:
+                raise ValueError(n)
+            return [n]
+        error = self.run_pipeline([Stage('fail', fail, 2, 2), Stage('sink', lambda n: None, 1, 2)], range(50))
+        self.assertIsInstance(error, ValueError)
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError('%d' % status, response=response)
+
+
+class RetryTest(TestCase):
+
+    def test_classify(self):
+        for error, reason in ((http_error(429), 'ratelimited'), (http_error(503), 'ratelimited'),
+                              (http_error(500), 'transient'), (http_error(502), 'transient'),
+                              (http_error(408), 'transient'), (http_error(404), 'permanent'),
+                              (http_error(403), 'permanent'), (ValueError('No JSON object'), 'permanent'),
+                              (KeyError('activities'), 'permanent'), (socket.error(104, 'reset'), 'transient'),
+                              (socket.timeout('timed out'), 'transient'),
+                              (requests.exceptions.ConnectionError('refused'), 'transient')):
+            self.assertEqual(classify(error).reason, reason, repr(error))
+
+    def failing(self, error):
+        calls = []
+
+        def func():
+            calls.append(1)
+            raise error
+        return func, calls
+
+    def test_permanent_error_is_not_retried(self):
+        func, calls = self.failing(ValueError('not json'))
+        with self.assertRaises(PermanentError) as raised:
+            retrying(func, attempts=4, base=0)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((raised.exception.reason, raised.exception.attempts), ('permanent', 1))
+
+    def test_transient_error_is_retried_until_attempts_run_out(self):
+        func, calls = self.failing(socket.error(104, 'reset'))
+        with self.assertRaises(TransientError) as raised:
+            retrying(func, attempts=3, base=0)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual((raised.exception.reason, raised.exception.attempts), ('transient', 3))
+
+    def test_success_after_a_retry(self):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) < 2:
+                raise http_error(502)
+            return 'body'
+        self.assertEqual(retrying(func, attempts=3, base=0), 'body')
+
+
+class DeadLettersTest(TestCase):
+
+    def test_failures_add_up_and_leave_once_stored(self):
+        listing = {'id': 7, 'url': '/reports/7', 'title': 'seven'}
+        letters = DeadLetters()
+        letters.add(1, listing, 'transient', 'reset', 4)
+        letters.flush()
+        letters.add(1, listing, 'permanent', 'not json', 1)
+        letters.flush()
+        letter = deadletter.objects.get(report_id=7)
+        self.assertEqual((letter.reason, letter.attempts), ('permanent', 5))
+        self.assertEqual(failed(), [(1, listing)])
+        self.assertEqual(failed(['transient']), [])
+        # a later batch stored the report
+        letters([(result(report_id=7), [], [], 1)])
+        self.assertFalse(deadletter.objects.exists())
+
+
+class ReportWriterTest(TestCase):
+
+    def report(self, report_id, title, activities):
+        return (result(report_id=report_id, title=title), [summar(report_id=report_id, content=title)],
+                [dialogue(report_id=report_id, message='%s %d' % (title, n)) for n in range(activities)])
+
+    def test_stored_reports_are_replaced_and_listeners_see_each_once(self):
+        seen = []
+        writer = ReportWriter(10, [lambda items: seen.extend(item[0].report_id for item in items)])
+        writer.add(*self.report(1, 'one', 3))
+        writer.add(*self.report(2, 'two', 2))
+        writer.flush()
+        # the listing shifted: report 1 comes twice in the next batch
+        writer.add(*self.report(1, 'stale', 5))
+        writer.add(*self.report(3, 'three', 1))
+        writer.add(*self.report(1, 'one again', 1))
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual(sorted(seen), [1, 1, 2, 3])
+        self.assertEqual(dict(result.objects.values_list('report_id', 'title')),
+                         {1: 'one again', 2: 'two', 3: 'three'})
+        self.assertEqual(list(dialogue.objects.filter(report_id=1).values_list('message', flat=True)),
+                         ['one again 0'])
+        self.assertEqual(list(summar.objects.filter(report_id=1).values_list('content', flat=True)),
+                         ['one again'])
+        self.assertEqual(dialogue.objects.filter(report_id=2).count(), 2)
+
+
+class TokenBucketTest(TestCase):
+
+    def test_throttle_halves_rate_down_to_min_rate(self):
+        bucket = TokenBucket(rate=4, burst=2, min_rate=1.5, max_rate=4)
+        bucket.throttle()
+        self.assertEqual(bucket.rate, 2)
+        self.assertEqual(bucket.tokens, 0)
+        bucket.throttle()
+        self.assertEqual(bucket.rate, 1.5)
+
+    def test_throttle_honours_retry_after(self):
+        bucket = TokenBucket(rate=100)
+        bucket.throttle(retry_after=0.2)
+        start = time.time()
+        bucket.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.15)
+
+    def test_recover_steps_back_up_to_max_rate(self):
+        bucket = TokenBucket(rate=1, max_rate=1.1, step=0.05)
+        bucket.throttle()
+        bucket.recover()
+        self.assertAlmostEqual(bucket.rate, 0.55)
+        for n in range(20):
+            bucket.recover()
+        self.assertEqual(bucket.rate, 1.1)
+
+
+class CheckpointTest(TestCase):
+
+    def commit(self, checkpoint, *reports):
+        checkpoint.commit([(result(report_id=report_id), [], [], page) for report_id, page in reports])
+
+    def test_last_page_moves_past_complete_pages_only(self):
+        checkpoint = Checkpoint('test', 3)
+        checkpoint.expect(1, 2)
+        checkpoint.expect(2, 1)
+        self.commit(checkpoint, (20, 2))
+        self.assertEqual(checkpoint.state.last_page, 0)
+        self.assertEqual(checkpoint.ingested, {'20': '2'})
+        self.commit(checkpoint, (10, 1), (11, 1))
+        self.assertEqual(checkpoint.state.last_page, 2)
+        self.assertEqual(checkpoint.ingested, {})
+        # a report the detail stage dropped still completes its page
+        checkpoint.expect(3, 1)
+        checkpoint.unchanged(3)
+        self.commit(checkpoint)
+        self.assertEqual(checkpoint.state.last_page, 3)
+
+    def test_resume_after_interruption(self):
+        checkpoint = Checkpoint('test', 3)
+        checkpoint.expect(1, 1)
+        checkpoint.expect(2, 2)
+        self.commit(checkpoint, (10, 1), (20, 2))
+        resumed = Checkpoint('test', 3)
+        self.assertEqual(resumed.first_page, 2)
+        self.assertEqual(resumed.ingested, {'20': '2'})
+        resumed.finish()
+        self.assertEqual(Checkpoint('test', 3).first_page, 1)
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    # paths in server.redirects redirect, anything else is a small png
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        location = self.server.redirects.get(self.path)
+        if location:
+            self.send_response(302)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', '4')
+        self.end_headers()
+        self.wfile.write('\x89PNG')
+
+
+class AssetsTest(TestCase):
+
+    def test_public_address(self):
+        for address in ('8.8.8.8', '93.184.216.34', '2001:4860:4860::8888', '::ffff:8.8.8.8'):
+            self.assertTrue(assets.public_address(address), address)
+        for address in ('127.0.0.1', '10.1.2.3', '172.16.0.1', '192.168.1.1', '169.254.169.254',
+                        '100.64.0.1', '0.0.0.0', '224.0.0.1', '::1', '::', 'fe80::1%eth0', 'fd00::1',
+                        '::ffff:127.0.0.1', '::ffff:10.0.0.1', '::ffff:169.254.169.254'):
+            self.assertFalse(assets.public_address(address), address)
+
+    def test_check_url(self):
+        for url in ('ftp://example.com/a.png', 'file:///etc/passwd', 'http:///a.png',
+                    'http://127.0.0.1/a.png', 'http://10.0.0.1/a.png', 'http://localhost:8000/',
+                    'http://[::1]/a.png', 'http://[::ffff:127.0.0.1]/a.png'):
+            with self.assertRaises(PermanentError):
+                assets.check_url(url)
+        assets.check_url('http://8.8.8.8/a.png')
+        assets.check_url('https://[2001:4860:4860::8888]/a.png')
+
+    def test_parse_range(self):
+        for header, expected in (('', None), ('bytes=0-9', (0, 9)), ('bytes=95-200', (95, 99)),
+                                 ('bytes=90-', (90, 99)), ('bytes=-10', (90, 99)), ('bytes=-200', (0, 99)),
+                                 ('bytes=-0', False), ('bytes=100-', False), ('bytes=5-2', False),
+                                 ('bytes=-', None), ('bytes=0-1,5-6', None), ('items=0-9', None)):
+            self.assertEqual(assets.parse_range(header, 100), expected, header)
+
+    def test_localize(self):
+        digest = 'ab' * 32
+        asset.objects.create(report_id=1, key='url:1', url='https://example.com/f?x=1&y=2', file_name='a b.png',
+                             sha256=digest, status='done')
+        asset.objects.create(report_id=1, key='url:2', url='https://example.com/pending.png')
+        asset.objects.create(report_id=2, key='url:1', url='https://example.com/other.png', sha256=digest,
+                             status='done')
+        html = ('<img src="https://example.com/f?x=1&amp;y=2"> <a href=\'https://example.com/pending.png\'>x</a> '
+                '<img src="https://example.com/other.png">')
+        self.assertEqual(assets.localize(html, 1),
+                         '<img src="/assets/%s/a%%20b.png"> <a href=\'https://example.com/pending.png\'>x</a> '
+                         '<img src="https://example.com/other.png">' % digest)
+        self.assertEqual(assets.localize(html, 3), html)
+
+
+class MirrorTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='mirrortest-')
+        self.mirror = Mirror(self.root, workers=1, rate=1000)
+        self.blocked = assets.BLOCKED
+        self.server = HTTPServer(('127.0.0.1', 0), RedirectHandler)
+        self.server.redirects = {}
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://%s:%d' % self.server.server_address
+
+    def tearDown(self):
+        assets.BLOCKED = self.blocked
+        self.mirror.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def allow_loopback(self):
+        loopback = assets.parse_network('127.0.0.0/8')
+        assets.BLOCKED = [network for network in self.blocked if network != loopback]
+
+    def test_loopback_is_refused(self):
+        server = ReplayServer().start()
+        try:
+            with self.assertRaises(PermanentError):
+                self.mirror.fetch(server.url + '/reports/1')
+            self.assertEqual(server.served, 0)
+        finally:
+            server.stop()
+
+    def test_every_redirect_is_checked(self):
+        self.allow_loopback()
+        self.server.redirects = {'/local': self.url + '/file', '/private': 'http://10.0.0.1/file',
+                                 '/hop': '/mapped', '/mapped': 'http://[::ffff:192.168.0.1]/file'}
+        digest, size, content_type = self.mirror.fetch(self.url + '/local')
+        self.assertEqual((size, content_type), (4, 'image/png'))
+        with self.assertRaises(PermanentError) as raised:
+            self.mirror.fetch(self.url + '/private')
+        self.assertIn('10.0.0.1', raised.exception.args[0])
+        with self.assertRaises(PermanentError) as raised:
+            self.mirror.fetch(self.url + '/hop')
+        self.assertIn('192.168.0.1', raised.exception.args[0])
@@ -1,30 +1,108 @@
-from django.shortcuts import render,render_to_response
+from django.conf import settings
+from django.shortcuts import render,get_object_or_404
+from django.template.loader import render_to_string
 from crawl import *
 from report.models import *
-from django.http.response import HttpResponse
+from django.http.response import HttpResponse, JsonResponse
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from forms import *
+from jobs import enqueue
+from search import get_backend
+from assets import localize
+from cache import listing_generation, page_cache, report_cache
+from stats import overview
+from metrics import REGISTRY, render as render_metrics
+SEARCH_PAGE_SIZE = 25
+INDEX_PAGE_SIZE = getattr(settings, 'INDEX_PAGE_SIZE', 25)
+INDEX_CACHE_TIMEOUT = getattr(settings, 'INDEX_CACHE_TIMEOUT', 3600)
 # Create your views here.
-def scrapper(request):     # all report crawl
-    scrappe()
-                
-    return HttpResponse("crawl success")
+def scrapper(request):     # all report crawl, run by manage.py crawlworker
+    return job_created(enqueue('scrappe'))
 def index(request):
-        results =result.objects.all()
-        summarys= summary.objects.all().last()  
-        if request.method == "POST":
-            key = request.POST['key']
-            title =  result.objects.filter(title__contains=key)
+        key = request.POST.get('key') or request.GET.get('key')
+        if key:
+            try:
+                page = max(int(request.GET.get('page', 1)), 1)
+            except ValueError:
+                page = 1
+            keys, total = get_backend().search(key, (page - 1) * SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE)
+            previous_page = page - 1
+            next_page = page + 1 if page * SEARCH_PAGE_SIZE < total else 0
             return render(request,'search.html',locals())
-        return render(request, 'index.html', locals())
-        
+        after = id_param(request, 'after')
+        before = id_param(request, 'before')
+        # rendered pages live until the crawler writes (see cache.invalidate)
+        cache_key = 'index:%s:%s:%s' % (listing_generation(), after or '', before or '')
+        html = page_cache().get(cache_key)
+        if html is None:
+            html = render_to_string('index.html', listing_page(after, before))
+            page_cache().set(cache_key, html, INDEX_CACHE_TIMEOUT)
+        return HttpResponse(html)
+def id_param(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+def listing_page(after=None, before=None):
+    # keyset pagination on the report_id index: no COUNT(*), no OFFSET
+    reports = result.objects.only('report_id', 'title')
+    if before is not None:
+        rows = list(reports.filter(report_id__gt=before).order_by('report_id')[:INDEX_PAGE_SIZE + 1])
+        more = len(rows) > INDEX_PAGE_SIZE
+        results = rows[:INDEX_PAGE_SIZE][::-1]
+        previous_id = results[0].report_id if more else None
+        next_id = results[-1].report_id if results else None
+    else:
+        if after is not None:
+            reports = reports.filter(report_id__lt=after)
+        rows = list(reports.order_by('-report_id')[:INDEX_PAGE_SIZE + 1])
+        results = rows[:INDEX_PAGE_SIZE]
+        previous_id = results[0].report_id if after is not None and results else None
+        next_id = results[-1].report_id if len(rows) > INDEX_PAGE_SIZE else None
+    return {
+        'results': results,
+        'summarys': summary.objects.order_by('-pk').first(),
+        'previous_id': previous_id,
+        'next_id': next_id,
+    }
+
 def report(request,id):
+        return HttpResponse(report_cache.get(id, lambda: render_report(id)))
+def render_report(id):
         results =result.objects.filter(report_id=id)
         dialogues = dialogue.objects.filter(report_id=id)        
         summaries = summar.objects.filter(report_id=id)
-        return render_to_response("report.html",locals()) 
+        attachments = asset.objects.filter(report_id=id, status='done', key__startswith='attachment:')
+        return localize(render_to_string("report.html",locals()), id)
+def stats(request):
+    return JsonResponse(overview())
+def cache_stats(request):
+    return JsonResponse({'report_cache': report_cache.stats()})
+def metrics(request):
+    # Prometheus scrape target
+    return HttpResponse(render_metrics(REGISTRY.collect()), content_type='text/plain; version=0.0.4')
 def updates(request):
-    update()
-    summary1= summary.objects.all().last() 
-    summary2= summary.objects.all().order_by('-pk')[1:2]
-    return render_to_response("update.html",locals()) 
\ No newline at end of file
+    return job_created(enqueue('update'))
+def refreshes(request):
+    return job_created(enqueue('refresh'))
+def job_created(current):
+    return JsonResponse({'job': current.pk, 'status': current.status,
+                         'url': '/jobs/%d/' % current.pk}, status=202)
+def job_status(request, id):
+    current = get_object_or_404(job, pk=id)
+    return JsonResponse({
+        'job': current.pk,
+        'kind': current.kind,
+        'status': current.status,
+        'pages': current.pages,
+        'pages_done': current.pages_done,
+        'reports': current.reports,
+        'requests': current.requests,
+        'requests_per_second': round(current.requests_per_second(), 2),
+        'create_time': current.create_time,
+        'start_time': current.start_time,
+        'end_time': current.end_time,
+        'worker': current.worker,
+        'heartbeat': current.heartbeat,
+        'error': current.error,
+    })